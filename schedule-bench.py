@@ -0,0 +1,174 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import schedule
+
+HEADER = ['NRC', 'Clave', 'Materia', 'Secc', 'Días', 'Hora', 'Profesor', 'Salón', '']
+
+# days of each class, and how many hours each block takes on each of those days
+PATTERNS = [
+    ('LMV', 1),
+    ('AJ', 2),
+    ('LAMJ', 1),
+    ('MV', 2),
+]
+
+def generate_catalog(
+        filename: str,
+        subjects: int,
+        sections: int,
+        duplicates: int = 0,
+        slots: int = 14,
+        seed: int = 0,
+    ):
+    """
+    Writes a synthetic catalog to `filename` (.csv), with the same columns as classes/p2024.xlsx:
+        - subjects: number of course names
+        - sections: courses per name, with random times
+        - duplicates: extra courses per name, each with the same times as another one
+        - slots: number of hours classes can start at, from 07:00 (fewer is denser)
+    """
+
+    assert 1 <= slots <= 14
+    rng = random.Random(seed)
+    nrc = itertools.count(10000)
+
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+
+        for s in range(subjects):
+            times = []
+            for _ in range(sections):
+                days, hours = rng.choice(PATTERNS)
+                start = 7 + rng.randrange(max(1, slots - hours + 1))
+                times.append((days, f'{start:02}00-{start + hours - 1:02}59'))
+
+            times.extend(rng.choice(times) for _ in range(duplicates))
+
+            for sec, (days, hours) in enumerate(times):
+                n = next(nrc)
+                prof = f'PROFESOR - {s:03} {sec:03}'
+                for day in days:
+                    writer.writerow([
+                        n, f'BENCH {s:03}', f'Materia {s}', 100 + sec, day, hours,
+                        prof, f'1CCO{sec % 5}/{rng.randrange(100, 400)}', ''
+                    ])
+
+def timed(f, repeat: int) -> tuple[float, any]:
+    """
+    Runs `f` `repeat` times. Returns the best wall time and the last result.
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+def bench(
+        subjects: int,
+        sections: int,
+        duplicates: int,
+        slots: int,
+        render: int,
+        repeat: int,
+        seed: int,
+    ) -> dict:
+    """
+    Times each phase for a generated catalog. Returns the results.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'catalog.csv')
+        generate_catalog(filename, subjects, sections, duplicates, slots, seed)
+
+        parse, courses_by_nrc = timed(lambda: schedule.parse_file(filename), repeat)
+
+    names = [f'Materia {s}' for s in range(subjects)]
+    collect, courses_by_name = timed(
+        lambda: schedule.collect_courses(courses_by_nrc, names), repeat
+    )
+
+    def combine():
+        combinations = []
+        schedule.combine_r(
+            schedule.SchedulePrototype(), list(courses_by_name.values()), combinations
+        )
+        return combinations
+
+    search, combinations = timed(combine, repeat)
+
+    def write():
+        writer = schedule.ScheduleWriter(courses_by_nrc, io.StringIO())
+        for nrcs in combinations[:render]:
+            writer.write(schedule.SchedulePrototype.from_nrcs(nrcs, courses_by_nrc))
+
+        writer.flush()
+
+    rendering, _ = timed(write, repeat)
+
+    return {
+        'subjects' : subjects,
+        'sections' : sections,
+        'duplicates' : duplicates,
+        'slots' : slots,
+        'courses' : len(courses_by_nrc),
+        'schedules' : len(combinations),
+        'rendered' : min(render, len(combinations)),
+        'parse_file' : parse,
+        'collect_courses' : collect,
+        'combine_r' : search,
+        'render' : rendering,
+    }
+
+def int_list(s: str) -> list[int]:
+    return [int(n) for n in s.split(',')]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Times parse_file, collect_courses, combine_r and rendering '
+            'on synthetic catalogs, for every combination of the given sizes.'
+    )
+    parser.add_argument('-s', '--subjects', type=int_list, default=[3, 5, 7], help='e.g. 3,5,7')
+    parser.add_argument('-n', '--sections', type=int_list, default=[4, 8, 12], help='e.g. 4,8,12')
+    parser.add_argument('-d', '--duplicates', type=int_list, default=[0, 4], help='e.g. 0,4')
+    parser.add_argument('--slots', type=int_list, default=[10], help='e.g. 6,14')
+    parser.add_argument('--render', type=int, default=1000, help='schedules to render')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per phase, best is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench-results.json')
+    args = parser.parse_args()
+
+    results = []
+    for subjects, sections, duplicates, slots in itertools.product(
+        args.subjects, args.sections, args.duplicates, args.slots
+    ):
+        result = bench(subjects, sections, duplicates, slots, args.render, args.repeat, args.seed)
+        results.append(result)
+
+        print(
+            f'{subjects:>3} subjects {sections:>3} sections {duplicates:>3} duplicates '
+            f'{slots:>3} slots: {result["schedules"]:>9} schedules  '
+            f'parse {result["parse_file"]:.4f}s  collect {result["collect_courses"]:.4f}s  '
+            f'combine {result["combine_r"]:.4f}s  render {result["render"]:.4f}s'
+        )
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'python' : platform.python_version(),
+            'seed' : args.seed,
+            'repeat' : args.repeat,
+            'results' : results,
+        }, f, indent=4)
+
+    print(f'Results written to {args.output}')
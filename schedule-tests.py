@@ -1,5 +1,18 @@
+import asyncio
+import collections
+import contextlib
+import importlib
+import csv
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
 import unittest
+import unittest.mock
 import schedule
+import tabulate
 
 def fast_course():
     return schedule.Course('12345', '000', 'Some course', '000', 'Some professor')
@@ -7,6 +20,39 @@ def fast_course():
 def fast_schedule(time, room='room'):
     return schedule.CourseData(time, room, 0)
 
+def make_course(nrc, name, *classes):
+    c = schedule.Course(nrc, '000', name, '000', f'Professor {nrc}')
+    for day, time in classes:
+        c.add_class(day, time, 'room')
+
+    return c
+
+def course_fields(course):
+    return {field : getattr(course, field) for field in schedule.Course.__slots__}
+
+def fast_possibilities():
+    return [
+        [
+            make_course('1', 'A', ('L', '0700-0859')),
+            make_course('2', 'A', ('L', '0900-1059')),
+        ],
+        [
+            make_course('3', 'B', ('L', '0800-0959')),
+            make_course('4', 'B', ('L', '1100-1259')),
+        ],
+    ]
+
+def three_name_possibilities() -> list[list[schedule.Course]]:
+    # 5 has the same time as 2
+    possibilities = fast_possibilities()
+    possibilities[0].append(make_course('5', 'A', ('L', '0900-1059')))
+    possibilities.append([
+        make_course('6', 'C', ('M', '1000-1059')),
+        make_course('7', 'C', ('J', '1000-1059')),
+    ])
+
+    return possibilities
+
 class RangeCollisionTester(unittest.TestCase):
     """
     There are four scenarios. Given ranges A and B:
@@ -246,5 +292,957 @@ class CourseTimeavailabilityTester(unittest.TestCase):
         ]
         self.assertFalse(c.time_available('M', t))
 
+class TimeMaskTester(unittest.TestCase):
+    """
+    Bitmasks have to agree with CourseData.time_collision.
+    """
+
+    def assertMaskCollision(self, a, b):
+        a, b = fast_schedule(a), fast_schedule(b)
+        self.assertEqual(bool(a.mask & b.mask), a.time_collision(b))
+
+    def test_mask_collision_agrees(self):
+        self.assertMaskCollision('0700-0859', '0800-0959')
+        self.assertMaskCollision('0800-0859', '0700-0959')
+        self.assertMaskCollision('0800-0900', '0800-0900')
+        self.assertMaskCollision('1100-1350', '0700-1129')
+
+    def test_mask_no_collision_with_same_limit(self):
+        a = fast_schedule('0800-0900')
+        b = fast_schedule('0900-1000')
+
+        self.assertFalse(a.mask & b.mask)
+        self.assertFalse(a.time_collision(b))
+
+    def test_mask_no_collision_across_hour(self):
+        a = fast_schedule('0700-0759')
+        b = fast_schedule('0759-0859')
+
+        self.assertFalse(a.mask & b.mask)
+
+    def test_course_masks(self):
+        c = fast_course()
+        c.add_class('L', '0700-0759', 'room')
+        c.add_class('L', '1000-1159', 'room')
+
+        self.assertEqual(
+            c.masks['L'],
+            fast_schedule('0700-0759').mask | fast_schedule('1000-1159').mask
+        )
+
+class SchedulePrototypeTester(unittest.TestCase):
+    def test_can_add_course(self):
+        a = fast_course()
+        a.add_class('L', '0700-0859', 'room')
+        b = schedule.Course('54321', '000', 'Other course', '000', 'Some professor')
+        b.add_class('L', '0859-0959', 'room')
+        b.add_class('A', '0700-0859', 'room')
+
+        prot = schedule.SchedulePrototype()
+        self.assertTrue(prot.can_add_course(a))
+        prot.add_course(a)
+
+        self.assertFalse(prot.can_add_course(a))
+        self.assertTrue(prot.can_add_course(b))
+
+    def test_remove_course(self):
+        a = fast_course()
+        a.add_class('L', '0700-0859', 'room')
+        b = schedule.Course('54321', '000', 'Other course', '000', 'Some professor')
+        b.add_class('L', '0900-0959', 'room')
+        b.add_class('A', '0700-0859', 'room')
+
+        prot = schedule.SchedulePrototype()
+        prot.add_course(a)
+        prot.add_course(b)
+        prot.remove_course(b)
+
+        self.assertEqual(prot.nrcs, ['12345'])
+        self.assertEqual(list(prot.schedule.keys()), ['L'])
+        self.assertEqual(prot.masks, a.masks)
+        self.assertTrue(prot.can_add_course(b))
+
+class CombineTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+
+    def test_combine_r(self):
+        prot = schedule.SchedulePrototype()
+        combinations = []
+        schedule.combine_r(prot, self.possibilities, combinations)
+
+        self.assertEqual(combinations, [('1', '4'), ('2', '4')])
+        self.assertEqual(prot.nrcs, [])
+        self.assertEqual(prot.schedule, {})
+
+    def test_iter_schedules_with_professor_whitelist(self):
+        schedules = schedule.iter_schedules(
+            self.possibilities,
+            professor_whitelist=['Professor 2']
+        )
+        self.assertEqual(list(schedules), [('2', '4')])
+
+        schedules = schedule.iter_schedules(
+            self.possibilities,
+            professor_whitelist=['Professor 3']
+        )
+        self.assertEqual(list(schedules), [])
+
+    def test_iter_schedules_is_lazy(self):
+        schedules = schedule.iter_schedules(self.possibilities)
+
+        self.assertEqual(next(schedules), ('1', '4'))
+        self.assertEqual(list(schedules), [('2', '4')])
+
+class CompatibilityMatrixTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+
+    def test_matrix(self):
+        matrix = schedule.CompatibilityMatrix(self.possibilities)
+
+        self.assertEqual([c.nrc for c in matrix.courses], ['1', '2', '3', '4'])
+        self.assertEqual(matrix.domains, [0b0011, 0b1100])
+        self.assertEqual(matrix.compatible, [0b1011, 0b1011, 0b1100, 0b1111])
+
+    def test_dead_end_is_pruned_before_descending(self):
+        self.possibilities.append([
+            make_course('5', 'C', ('L', '1100-1159')),
+        ])
+
+        self.assertEqual(list(schedule.iter_schedules(self.possibilities)), [])
+
+    def test_schedules_on_top_of_prototype(self):
+        prot = schedule.SchedulePrototype()
+        prot.add_course(make_course('0', 'Z', ('L', '0700-0759')))
+
+        self.assertEqual(
+            list(schedule.iter_schedules(self.possibilities, prot)),
+            [('0', '2', '4')]
+        )
+
+class SearchOrderTester(unittest.TestCase):
+    def setUp(self):
+        # the last name has a single course, so MRV picks it first
+        self.possibilities = fast_possibilities()
+        self.possibilities[0].append(make_course('5', 'A', ('A', '0700-0859')))
+        self.possibilities.append([make_course('6', 'C', ('L', '1000-1059'))])
+
+    def test_orders_find_the_same_schedules(self):
+        static = list(schedule.iter_schedules(
+            self.possibilities, order=schedule.SearchOrder.STATIC
+        ))
+        mrv = list(schedule.iter_schedules(
+            self.possibilities, order=schedule.SearchOrder.MRV
+        ))
+
+        self.assertEqual(static, [('1', '4', '6'), ('5', '3', '6'), ('5', '4', '6')])
+        self.assertEqual(sorted(mrv), static)
+
+class GroupByTimeTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+        self.possibilities[0].append(make_course('5', 'A', ('L', '0900-1059')))
+
+    def test_group_by_time(self):
+        groups = schedule.group_by_time(self.possibilities[0])
+        self.assertEqual([[c.nrc for c in g] for g in groups], [['1'], ['2', '5']])
+
+    def test_white_listed_professors_are_not_grouped(self):
+        groups = schedule.group_by_time(self.possibilities[0], ['Professor 5'])
+        self.assertEqual([[c.nrc for c in g] for g in groups], [['1'], ['2'], ['5']])
+
+    def test_iter_schedule_groups(self):
+        self.assertEqual(
+            list(schedule.iter_schedule_groups(self.possibilities)),
+            [(('1',), ('4',)), (('2', '5'), ('4',))]
+        )
+        self.assertEqual(
+            list(schedule.iter_schedules(self.possibilities)),
+            [('1', '4'), ('2', '4'), ('5', '4')]
+        )
+
+    def test_groups_respect_professor_whitelist(self):
+        self.assertEqual(
+            list(schedule.iter_schedules(self.possibilities, professor_whitelist=['Professor 5'])),
+            [('5', '4')]
+        )
+
+class OptionalSearchTester(unittest.TestCase):
+    def setUp(self):
+        # A and B as in `fast_possibilities`, C fits with everything, D only with 2 and 3
+        self.possibilities = fast_possibilities() + [
+            [make_course('5', 'C', ('M', '0700-0859'))],
+            [make_course('6', 'D', ('L', '0700-0759')), make_course('7', 'D', ('L', '1100-1159'))],
+        ]
+
+    def best(self, k, weights, required=1, min_names=None, max_names=None, whitelist=[]):
+        search = schedule.OptionalSearch(
+            self.possibilities, weights, required, min_names, max_names, whitelist
+        )
+        return search.best(k)
+
+    def test_heaviest_first(self):
+        self.assertEqual(self.best(3, [0, 1, 2, 4]), [
+            (7, ('2', '4', '5', '6')),
+            (6, ('1', '5', '7')),
+            (6, ('2', '5', '6')),
+        ])
+
+    def test_name_count(self):
+        self.assertEqual(self.best(2, [0, 1, 2, 4], max_names=2), [
+            (4, ('1', '7')),
+            (4, ('2', '6')),
+        ])
+        self.assertEqual(self.best(10, [0, 1, 2, 4], min_names=4, max_names=4), [
+            (7, ('2', '4', '5', '6')),
+        ])
+
+    def test_required_and_whitelist(self):
+        self.assertEqual(self.best(1, [0, 0, 2, 4], required=2), [(6, ('2', '4', '5', '6'))])
+        self.assertEqual(self.best(1, [0, 1, 2, 4], whitelist=['Professor 3']), [])
+        self.assertEqual(
+            self.best(1, [0, 1, 2, 4], whitelist=['Professor 7']),
+            [(6, ('1', '5', '7'))]
+        )
+
+    def test_required_without_courses(self):
+        self.possibilities[0] = []
+        self.assertEqual(self.best(1, [0, 1, 2, 4]), [])
+
+    def test_course_whitelist_makes_names_required(self):
+        courses_by_nrc = {c.nrc : c for courses in self.possibilities for c in courses}
+        config = {key : [] for key in schedule.CONFIG_KEYS.values()}
+        config['sin-horarios'] = {}
+        config['materias-opcionales'] = {'B' : 1, 'D' : 4}
+        config['total-materias'] = 1
+        config['con-cursos'] = ['3']
+
+        search = schedule.optional_search(courses_by_nrc, config)
+        self.assertEqual(search.best(2), [(0, ('3',))])
+
+        config['total-materias'] = [1, 2]
+        search = schedule.optional_search(courses_by_nrc, config)
+        self.assertEqual(search.best(2), [(4, ('3', '6')), (4, ('3', '7'))])
+
+class ParallelSearchTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+        self.possibilities[0].append(make_course('5', 'A', ('A', '0700-0859')))
+        self.possibilities.append([
+            make_course('6', 'C', ('M', '1000-1059')),
+            make_course('7', 'C', ('J', '1000-1059')),
+        ])
+
+    def test_split_keeps_serial_order(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+        nodes = search.split(4)
+
+        self.assertGreaterEqual(len(nodes), 4)
+        self.assertEqual(
+            [s for node in nodes for s in search.run(node)],
+            list(search)
+        )
+
+    def test_parallel_matches_serial(self):
+        self.assertEqual(
+            list(schedule.iter_schedules(self.possibilities, jobs=2)),
+            list(schedule.iter_schedules(self.possibilities))
+        )
+
+    def test_parallel_stops_early(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+        schedules = search.parallel(2)
+
+        self.assertEqual(next(schedules), next(iter(search)))
+        schedules.close()
+
+class ServerTester(unittest.TestCase):
+    def setUp(self):
+        possibilities = fast_possibilities()
+        self.courses_by_nrc = {c.nrc : c for courses in possibilities for c in courses}
+        self.config = {key : [] for key in schedule.CONFIG_KEYS.values()}
+        self.config[schedule.CONFIG_KEYS[schedule.ConfigKey.CLASS_NAMES]] = ['A', 'B']
+        self.config[schedule.CONFIG_KEYS[schedule.ConfigKey.TIME_RESTRICTIONS]] = {}
+
+        self.server = schedule.ScheduleServer(self.courses_by_nrc, jobs=1)
+        self.addCleanup(self.server.close)
+
+    def request(self, target: str, body: bytes) -> tuple[bytes, bytes]:
+        async def request():
+            server = await asyncio.start_server(self.server.handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(
+                    f'POST {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body
+                )
+                response = await reader.read()
+                writer.close()
+
+            return response
+
+        head, _, body = asyncio.run(request()).partition(b'\r\n\r\n')
+        return head.split(b'\r\n')[0], body
+
+    def dechunk(self, body: bytes) -> bytes:
+        chunks = []
+        while True:
+            size, _, body = body.partition(b'\r\n')
+            size = int(size, 16)
+            chunks.append(body[:size])
+            self.assertEqual(body[size:size + 2], b'\r\n')
+            body = body[size + 2:]
+
+            # the last chunk is empty
+            if not size:
+                break
+
+        self.assertEqual(body, b'')
+        return b''.join(chunks)
+
+    def test_schedules(self):
+        status, body = self.request('/schedules', json.dumps(self.config).encode())
+        self.assertEqual(status, b'HTTP/1.1 200 OK')
+
+        lines = self.dechunk(body).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['nrcs'] for line in lines],
+            [list(nrcs) for nrcs in schedule.iter_schedules(fast_possibilities())]
+        )
+
+    def test_count(self):
+        status, body = self.request('/count?grouped=1', json.dumps(self.config).encode())
+        self.assertEqual((status, body), (b'HTTP/1.1 200 OK', b'2\n'))
+
+    def test_cached_results(self):
+        body = json.dumps(self.config).encode()
+        _, first = self.request('/schedules?format=text', body)
+
+        # same config, reordered and with extra whitespace
+        self.config['materias'] = [' B ', 'A', 'A']
+        _, reordered = self.request('/schedules?limit=1', json.dumps(self.config).encode())
+        _, second = self.request('/schedules?format=text', body)
+
+        self.assertEqual(self.dechunk(first), self.dechunk(second))
+        self.assertIn(b'"nrcs": ["4", "1"]', reordered)
+        self.assertEqual(self.server.cache.hits, 2)
+        self.assertEqual(self.server.cache.misses, 1)
+
+    def test_bad_requests(self):
+        del self.config['materias']
+
+        status, body = self.request('/count', json.dumps(self.config).encode())
+        self.assertEqual(status, b'HTTP/1.1 400 Bad Request')
+        self.assertIn(b'materias', body)
+
+        status, _ = self.request('/schedules?limit=-1', b'{}')
+        self.assertEqual(status, b'HTTP/1.1 400 Bad Request')
+
+        status, _ = self.request('/nope', b'{}')
+        self.assertEqual(status, b'HTTP/1.1 404 Not Found')
+
+class IncrementalSearchTester(unittest.TestCase):
+    def setUp(self):
+        self.courses = three_name_possibilities()
+        self.search = schedule.IncrementalSearch()
+
+    def solve(self, *removed: str) -> list:
+        possibilities = [[c for c in courses if c.nrc not in removed] for courses in self.courses]
+        schedules = self.search.solve(['A', 'B', 'C'], possibilities)
+
+        self.assertEqual(
+            sorted(schedules),
+            sorted(schedule.ScheduleSearch(possibilities))
+        )
+        return schedules
+
+    def test_matches_searching_again(self):
+        self.solve('5')
+        self.assertEqual(self.search.mode, 'full')
+
+        self.solve('5', '4')
+        self.assertEqual(self.search.mode, 'filtered')
+
+        # 5 has the same time as 2, it joins its group
+        schedules = self.solve()
+        self.assertEqual(self.search.mode, 'incremental')
+        self.assertIn(('2', '5'), [s[0] for s in schedules])
+
+        self.solve('1', '6')
+        self.assertEqual(self.search.mode, 'filtered')
+
+        self.solve('1')
+        self.assertEqual(self.search.mode, 'incremental')
+
+    def test_watch_survives_invalid_config(self):
+        courses_by_nrc = {c.nrc : c for courses in self.courses for c in courses}
+        config = {key : [] for key in schedule.CONFIG_KEYS.values()}
+        config['materias'] = ['A', 'B', 'C']
+        config['sin-horarios'] = {'L' : ['0700-859']}
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        config_file = os.path.join(tmp.name, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+
+        def fix_config(seconds):
+            if fix_config.called:
+                raise KeyboardInterrupt
+
+            fix_config.called = True
+            config['sin-horarios'] = {'L' : ['0700-0859']}
+            with open(config_file, 'w') as f:
+                json.dump(config, f)
+            os.utime(config_file, ns=(0, 0))
+
+        fix_config.called = False
+        shown = []
+        err = io.StringIO()
+
+        with unittest.mock.patch('schedule.time.sleep', fix_config), contextlib.redirect_stderr(err):
+            with self.assertRaises(KeyboardInterrupt):
+                schedule.watch(config_file, courses_by_nrc, lambda schedules, search: shown.append(schedules))
+
+        self.assertIn('Invalid', err.getvalue())
+        self.assertEqual(len(shown), 1)
+
+class ResultCacheTester(unittest.TestCase):
+    def test_normalize_config(self):
+        config = {
+            'materias' : ['B', '  A  b', 'B'],
+            'sin-profesores' : ['Prof  X'],
+            'con-profesores' : [],
+            'sin-cursos' : [123, '45 '],
+            'con-cursos' : [],
+            'sin-horarios' : {
+                'L' : ['0900-1059', '0700-0859', '0800-0929', '1100-1159'],
+                'M' : [],
+            },
+        }
+
+        self.assertEqual(schedule.normalize_config(config, {'A b' : 'A  b'}), {
+            'materias' : ['A  b', 'B'],
+            'sin-profesores' : ['Prof X'],
+            'con-profesores' : [],
+            'sin-cursos' : ['123', '45'],
+            'con-cursos' : [],
+            'sin-horarios' : {'L' : ['0700-1059', '1100-1159']},
+        })
+
+    def test_lru_eviction(self):
+        cache = schedule.ResultCache(max_entries=2, max_bytes=100)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 10)
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.put('c', 3, 10)
+        self.assertIsNone(cache.get('b'))
+
+        cache.put('d', 4, 85)
+        self.assertEqual(list(cache.entries), ['c', 'd'])
+        self.assertEqual(cache.bytes, 95)
+
+        cache.put('e', 5, 101)
+        self.assertIsNone(cache.get('e'))
+        self.assertEqual(
+            (cache.hits, cache.misses, cache.evictions),
+            (1, 2, 2)
+        )
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            schedule.ResultCache(directory=tmp).put(('a', 1), [('1',)], 10)
+
+            cache = schedule.ResultCache(directory=tmp)
+            self.assertEqual(cache.get(('a', 1)), [('1',)])
+            self.assertEqual(cache.get(('a', 1)), [('1',)])
+            self.assertEqual((cache.hits, cache.disk_hits), (2, 1))
+            self.assertIsNone(cache.get(('a', 2)))
+
+class BatchTester(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        self.config = {key : [] for key in schedule.CONFIG_KEYS.values()}
+        self.config['materias'] = ['A', 'B']
+        self.config['sin-horarios'] = {}
+
+    def test_iter_configs(self):
+        configs = os.path.join(self.tmp.name, 'configs')
+        os.mkdir(configs)
+        for name, text in [('b.json', json.dumps(self.config)), ('a.json', '{'), ('notes.txt', '')]:
+            with open(os.path.join(configs, name), 'w') as f:
+                f.write(text)
+
+        found = list(schedule.iter_configs(configs))
+        self.assertEqual([(name, config) for name, config, _ in found], [('a', None), ('b', self.config)])
+        self.assertIsNotNone(found[0][2])
+
+        lines = os.path.join(self.tmp.name, 'configs.jsonl')
+        with open(lines, 'w') as f:
+            f.write(json.dumps(self.config) + '\n\n{}\n')
+
+        self.assertEqual(
+            list(schedule.iter_configs(lines)),
+            [('configs-1', self.config, None), ('configs-3', {}, None)]
+        )
+
+    def test_batch_run(self):
+        possibilities = fast_possibilities()
+        schedule._init_catalog_worker({c.nrc : c for courses in possibilities for c in courses})
+        self.addCleanup(schedule._init_catalog_worker, None)
+
+        filename = os.path.join(self.tmp.name, 'out.jsonl')
+        written, _, error = schedule._batch_run(self.config, filename, 'jsonl', False, 'mrv', None)
+
+        self.assertEqual((written, error), (2, None))
+        with open(filename) as f:
+            self.assertEqual(
+                [json.loads(line)['nrcs'] for line in f],
+                [list(nrcs) for nrcs in schedule.iter_schedules(possibilities)]
+            )
+
+        del self.config['materias']
+        written, _, error = schedule._batch_run(self.config, filename, 'jsonl', False, 'mrv', None)
+        self.assertEqual((written, error), (None, 'Key "materias" not found'))
+
+class CountTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = three_name_possibilities()
+
+    def test_count_matches_enumeration(self):
+        for whitelist in ([], ['Professor 5'], ['Professor 3']):
+            search = schedule.ScheduleSearch(self.possibilities, professor_whitelist=whitelist)
+
+            self.assertEqual(search.count(), len(list(schedule.iter_schedules(
+                self.possibilities, professor_whitelist=whitelist
+            ))))
+            self.assertEqual(search.count(grouped=True), len(list(search)))
+
+    def test_count_without_schedules(self):
+        self.possibilities.append([])
+        self.assertEqual(schedule.ScheduleSearch(self.possibilities).count(), 0)
+
+    def test_instrumented_search(self):
+        search = schedule.InstrumentedSearch(self.possibilities, professor_whitelist=['Professor 3'])
+        schedules = list(search)
+
+        self.assertEqual(schedules, list(schedule.ScheduleSearch(
+            self.possibilities, professor_whitelist=['Professor 3']
+        )))
+        self.assertEqual(search.leaves, len(schedules))
+        self.assertEqual(search.nodes[0], 1)
+        self.assertGreaterEqual(search.checks, sum(search.dead_ends) + search.leaves)
+        self.assertGreater(sum(search.pruned), 0)
+
+        # stopping early only counts what was actually checked
+        full = schedule.InstrumentedSearch(self.possibilities)
+        list(full)
+        first = schedule.InstrumentedSearch(self.possibilities)
+        next(iter(first))
+        self.assertEqual(first.leaves, 1)
+        self.assertLess(first.checks, full.checks)
+        self.assertLessEqual(sum(first.dead_ends), sum(full.dead_ends))
+
+        counted = schedule.InstrumentedSearch(self.possibilities)
+        counted.count()
+        self.assertIsNone(counted.leaves)
+
+    def test_stats_phases(self):
+        stats = schedule.Stats()
+        with stats.phase('a'):
+            pass
+        self.assertEqual(list(stats.timed(range(3), 'b')), [0, 1, 2])
+
+        self.assertEqual(list(stats.times), ['a', 'b'])
+        out = io.StringIO()
+        stats.report(file=out)
+        self.assertIn('Phase', out.getvalue())
+
+class SampleTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = three_name_possibilities()
+
+    def test_unrank_matches_enumeration(self):
+        for whitelist in ([], ['Professor 5'], ['Professor 3']):
+            search = schedule.ScheduleSearch(self.possibilities, professor_whitelist=whitelist)
+
+            for grouped, schedules in (
+                (True, list(search)),
+                (False, sorted(schedule.expand_groups(search)))
+            ):
+                count = search.counter(grouped)
+                unranked = [search.unrank(i, count, grouped) for i in range(len(schedules))]
+                self.assertEqual(unranked if grouped else sorted(unranked), schedules)
+                with self.assertRaises(IndexError):
+                    search.unrank(len(schedules), count, grouped)
+
+    def test_sample(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+        schedules = list(schedule.expand_groups(search))
+
+        sample = search.sample(3, random.Random(1))
+        self.assertEqual(len(set(sample)), 3)
+        self.assertTrue(set(sample) <= set(schedules))
+        self.assertEqual(search.sample(3, random.Random(1)), sample)
+
+        self.assertEqual(sorted(search.sample(100, random.Random(1))), sorted(schedules))
+        self.assertEqual(search.sample(0, random.Random(1)), [])
+
+        self.possibilities.append([])
+        self.assertEqual(schedule.ScheduleSearch(self.possibilities).sample(3, random.Random(1)), [])
+
+    def test_sample_is_uniform(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+        schedules = list(schedule.expand_groups(search))
+        rng = random.Random(2)
+
+        draws = collections.Counter(search.sample(1, rng)[0] for _ in range(200 * len(schedules)))
+        self.assertEqual(set(draws), set(schedules))
+        self.assertLess(max(draws.values()) / min(draws.values()), 2)
+
+class RankTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+        self.possibilities[0].append(make_course('5', 'A', ('A', '0900-1059')))
+        self.possibilities[1].append(make_course('6', 'B', ('A', '1100-1259')))
+
+    def test_scores(self):
+        prot = schedule.SchedulePrototype()
+        prot.add_course(make_course('1', 'A', ('L', '0700-0859'), ('A', '0700-0759')))
+        prot.add_course(make_course('2', 'B', ('L', '1000-1059')))
+
+        self.assertEqual(schedule.idle_minutes(prot), 61)
+        self.assertEqual(schedule.class_days(prot), 2)
+        self.assertEqual(schedule.early_start(prot), 24 * 60 - 7 * 60)
+        self.assertEqual(schedule.late_end(prot), 10 * 60 + 59)
+
+    def test_best_matches_sorting_every_schedule(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+
+        for names in (['days'], ['gaps'], ['end', 'start']):
+            score = schedule.Score.combine([schedule.SCORES[name] for name in names])
+            ranked = sorted(
+                (score(schedule.SchedulePrototype.from_nrcs(nrcs, self.courses())), i, nrcs)
+                for i, nrcs in enumerate(schedule.iter_schedules(self.possibilities))
+            )
+
+            self.assertEqual(search.best(2, score), [(s, nrcs) for s, _, nrcs in ranked[:2]])
+
+    def test_best_keeps_order_on_ties(self):
+        search = schedule.ScheduleSearch(self.possibilities)
+        score = schedule.Score(lambda prot: 0, monotone=True)
+
+        self.assertEqual(
+            [nrcs for _, nrcs in search.best(3, score)],
+            list(schedule.iter_schedules(self.possibilities))[:3]
+        )
+
+    def courses(self):
+        return {c.nrc : c for courses in self.possibilities for c in courses}
+
+class ScheduleWriterTester(unittest.TestCase):
+    def setUp(self):
+        self.courses = [
+            make_course('1', 'Some course', ('L', '0700-0859'), ('S', '1300-1459')),
+            make_course('2', 'Other course', ('A', '0900-1059'), ('J', '0830-0929')),
+            make_course('300', 'Tecnologías de la Información', ('M', '1000-1159'), ('V', '2000-2059')),
+        ]
+        self.courses_by_nrc = {c.nrc : c for c in self.courses}
+
+    def shown(self, prot, groups=None):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            prot.show(self.courses_by_nrc, groups)
+
+        return out.getvalue()
+
+    def test_render_matches_show(self):
+        # from one day to every day, including saturday
+        for n in range(1, len(self.courses) + 1):
+            prot = schedule.SchedulePrototype.from_nrcs(
+                [c.nrc for c in self.courses[-n:]], self.courses_by_nrc
+            )
+            writer = schedule.ScheduleWriter(self.courses_by_nrc)
+
+            self.assertEqual(writer.render(prot), self.shown(prot))
+
+    def test_render_groups_matches_show(self):
+        prot = schedule.SchedulePrototype.from_nrcs(['1', '2'], self.courses_by_nrc)
+        groups = (('1', '300'), ('2',))
+        writer = schedule.ScheduleWriter(self.courses_by_nrc)
+
+        self.assertEqual(writer.render(prot, groups), self.shown(prot, groups))
+
+    def test_write_in_batches(self):
+        prot = schedule.SchedulePrototype.from_nrcs(['1'], self.courses_by_nrc)
+        out = io.StringIO()
+        writer = schedule.ScheduleWriter(self.courses_by_nrc, out, buffer_size=1 << 20)
+
+        writer.write(prot)
+        writer.write(prot)
+        self.assertEqual(out.getvalue(), '')
+
+        writer.flush()
+        self.assertEqual(out.getvalue(), self.shown(prot) * 2)
+
+    def test_format_table_matches_tabulate(self):
+        for rows in (
+            [['123', '[A]', 'x', 'p'], ['58469', '[BB]', 'yy', 'q']],
+            [['0123/4', '[A]', 'x', 'p'], ['58469', '[BB]', 'yy', 'q']],
+            [['1.5', None, '-3', ' x'], ['nan', 'a\nb', '1e5', 'y']],
+            [[1, 2.5, None, 'z']],
+            [['1,000', 'True', 'x', '12,345.6'], ['5', 'False', 'y', '1']],
+        ):
+            self.assertEqual(
+                schedule.format_table(rows),
+                tabulate.tabulate(rows, tablefmt='plain')
+            )
+            self.assertEqual(
+                schedule.format_table(rows, ['a', 'b']),
+                tabulate.tabulate(rows, headers=['a', 'b'])
+            )
+            self.assertEqual(
+                schedule.format_table(rows, ['H', 'b', 'c', 'd']),
+                tabulate.tabulate(rows, headers=['H', 'b', 'c', 'd'])
+            )
+
+        rows = [['a', '12'], [None, '5'], ['bb', '123456']]
+        for headers in (['H', 'X'], ['Header', 'NRC'], ['', 'Longer header']):
+            self.assertEqual(schedule.format_table(rows, headers), tabulate.tabulate(rows, headers=headers))
+
+class OutputFormatTester(unittest.TestCase):
+    def setUp(self):
+        self.possibilities = fast_possibilities()
+        self.courses_by_nrc = {c.nrc : c for courses in self.possibilities for c in courses}
+        self.schedules = list(schedule.iter_schedules(self.possibilities))
+
+    def test_json_lines(self):
+        out = io.StringIO()
+        writer = schedule.JsonLinesWriter(out)
+        for nrcs in self.schedules:
+            writer.write(schedule.SchedulePrototype.from_nrcs(nrcs, self.courses_by_nrc))
+
+        writer.flush()
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual([tuple(line['nrcs']) for line in lines], self.schedules)
+        self.assertEqual(lines[0]['days'], {'L' : [
+            {'nrc' : '1', 'time' : '0700-0859', 'room' : 'room'},
+            {'nrc' : '4', 'time' : '1100-1259', 'room' : 'room'},
+        ]})
+
+    def test_binary_round_trip(self):
+        out = io.BytesIO()
+        writer = schedule.BinaryWriter(list(self.courses_by_nrc.keys()), 2, out)
+        for nrcs in self.schedules:
+            writer.write(schedule.SchedulePrototype.from_nrcs(nrcs, self.courses_by_nrc))
+
+        writer.flush()
+        out.seek(0)
+
+        self.assertEqual(list(schedule.read_binary(out)), self.schedules)
+
+class CollectCoursesTester(unittest.TestCase):
+    def setUp(self):
+        self.courses_by_nrc = {}
+        for nrc, name, time in [
+            ('1', 'A', '0700-0859'),
+            ('2', 'A', '0900-1059'),
+            ('3', 'B', '0800-0959'),
+            ('4', 'B', '1100-1259'),
+        ]:
+            c = schedule.Course(nrc, '000', name, '000', f'Professor {nrc}')
+            c.add_class('L', time, 'room')
+            self.courses_by_nrc[nrc] = c
+
+    def nrcs(self, courses):
+        return {name : [c.nrc for c in courses[name]] for name in courses}
+
+    def test_collect_courses(self):
+        courses = schedule.collect_courses(
+            self.courses_by_nrc,
+            ['A', 'B'],
+            professor_blacklist=['Professor 1'],
+            time_restrictions={'L' : ['1200-1259']}
+        )
+        self.assertEqual(self.nrcs(courses), {'A' : ['2'], 'B' : ['3']})
+
+    def test_course_whitelist_pins_name(self):
+        courses = schedule.collect_courses(
+            self.courses_by_nrc, ['A', 'B'], course_whitelist=['2']
+        )
+        self.assertEqual(self.nrcs(courses), {'A' : ['2'], 'B' : ['3', '4']})
+
+    def test_course_whitelist_unsatisfiable(self):
+        for whitelist in (['1', '2'], ['1', '5'], ['1']):
+            courses = schedule.collect_courses(
+                self.courses_by_nrc,
+                ['A', 'B'],
+                course_blacklist=['1'] if whitelist == ['1'] else [],
+                course_whitelist=whitelist
+            )
+            self.assertEqual(self.nrcs(courses), {'A' : [], 'B' : []})
+
+        # a repeated name only pins its course once
+        courses = schedule.collect_courses(
+            self.courses_by_nrc, ['A', 'A'], course_whitelist=['1', '5']
+        )
+        self.assertEqual(self.nrcs(courses), {'A' : []})
+
+    def test_course_index(self):
+        index = schedule.CourseIndex(self.courses_by_nrc)
+
+        self.assertEqual(index, self.courses_by_nrc)
+        self.assertEqual([c.nrc for c in index.by_name['B']], ['3', '4'])
+        self.assertEqual([c.nrc for c in index.by_professor['Professor 2']], ['2'])
+
+        restored = pickle.loads(pickle.dumps(index))
+        self.assertIs(restored.by_name['A'][0], restored['1'])
+
+        courses = schedule.collect_courses(
+            index, ['B', 'C'], time_restrictions={'L' : ['0700-0759', '0900-0929']}
+        )
+        self.assertEqual(self.nrcs(courses), {'B' : ['4'], 'C' : []})
+
+class ParseFileTester(unittest.TestCase):
+    filename = os.path.join(os.path.dirname(__file__), 'classes', 'p2024.xlsx')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def export(self, extension, delimiter, columns=9):
+        """
+        Writes the first `columns` columns of the test workbook the way a
+        spreadsheet would export them.
+        """
+
+        filename = os.path.join(self.tmp.name, f'data{extension}')
+        rows = [['NRC', 'Clave', 'Materia', 'Secc', 'Días', 'Hora', 'Profesor', 'Salón', '']]
+        rows.extend(schedule.iter_rows(self.filename))
+
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            for row in rows:
+                writer.writerow([str(int(v)) if isinstance(v, float) else v for v in row[:columns]])
+
+        return filename
+
+    def assertSameCourses(self, a, b):
+        self.assertEqual(list(a.keys()), list(b.keys()))
+        for nrc in a:
+            self.assertEqual(course_fields(a[nrc]), course_fields(b[nrc]))
+
+    def test_csv_and_tsv_match_workbook(self):
+        parsed = schedule.parse_file(self.filename)
+
+        self.assertSameCourses(schedule.parse_file(self.export('.csv', ',')), parsed)
+        self.assertSameCourses(schedule.parse_file(self.export('.tsv', '\t')), parsed)
+
+    def test_csv_without_last_column(self):
+        self.assertSameCourses(
+            schedule.parse_file(self.export('.csv', ',', columns=8)),
+            schedule.parse_file(self.filename)
+        )
+
+class CatalogTester(unittest.TestCase):
+    def setUp(self):
+        self.courses_by_nrc = {
+            '1' : make_course('1', 'A', ('L', '0700-0859'), ('M', '0700-0859')),
+            '2' : make_course('2', 'B', ('V', '1300-1359'), ('L', '0900-0959')),
+        }
+        self.catalog = schedule.Catalog(self.courses_by_nrc)
+
+    def test_catalog_is_a_dict_of_courses(self):
+        self.assertEqual(list(self.catalog.keys()), ['1', '2'])
+        self.assertEqual(len(self.catalog), 2)
+
+        for nrc, course in self.courses_by_nrc.items():
+            self.assertEqual(course_fields(self.catalog[nrc]), course_fields(course))
+            self.assertEqual(list(self.catalog[nrc].schedule), list(course.schedule))
+
+    def test_catalog_columns(self):
+        self.assertEqual(list(self.catalog.offsets), [0, 2, 4])
+        self.assertEqual(list(self.catalog.block_course), [0, 0, 1, 1])
+        self.assertEqual(list(self.catalog.block_day), [0, 2, 4, 0])
+        self.assertEqual(list(self.catalog.block_start), [700, 700, 1300, 900])
+        self.assertEqual(self.catalog.rooms, ['room'])
+
+    def test_collect_courses_from_catalog(self):
+        courses = schedule.collect_courses(self.catalog, ['A', 'B'])
+        self.assertEqual(
+            {name : [c.nrc for c in courses[name]] for name in courses},
+            {'A' : ['1'], 'B' : ['2']}
+        )
+
+    def check_time_filters(self):
+        self.assertEqual(self.catalog.available({'L' : ['0800-0859']}), [False, True])
+        self.assertEqual(self.catalog.available({'L' : ['0859-0900'], 'X' : ['0700-2059']}), [True, True])
+        self.assertEqual(self.catalog.available({'M' : ['0600-0659'], 'V' : ['1330-1429']}), [True, False])
+        self.assertEqual(self.catalog.available({}), [True, True])
+
+        # touching ranges are merged
+        self.assertEqual(
+            self.catalog.fits({'L' : ['0700-0800', '0800-0959'], 'V' : ['1200-1459']}),
+            [False, True]
+        )
+        self.assertEqual(
+            self.catalog.fits({'L' : ['0700-0959'], 'M' : ['0700-0859'], 'V' : ['1300-1358']}),
+            [True, False]
+        )
+
+    def test_time_filters(self):
+        with unittest.mock.patch.object(schedule, 'numpy', None):
+            self.check_time_filters()
+
+    @unittest.skipIf(schedule.numpy is None, 'NumPy is not installed')
+    def test_time_filters_with_numpy(self):
+        self.check_time_filters()
+
+class BenchCatalogTester(unittest.TestCase):
+    def test_generate_catalog(self):
+        bench = importlib.import_module('schedule-bench')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'catalog.csv')
+            bench.generate_catalog(filename, subjects=3, sections=4, duplicates=2, slots=6)
+            courses_by_nrc = schedule.parse_file(filename)
+
+        self.assertEqual(len(courses_by_nrc), 3 * (4 + 2))
+
+        courses = schedule.collect_courses(courses_by_nrc, ['Materia 0'])['Materia 0']
+        signatures = {c.time_signature() for c in courses}
+        self.assertLessEqual(len(signatures), 4)
+
+class ParseFileCacheTester(unittest.TestCase):
+    filename = os.path.join(os.path.dirname(__file__), 'classes', 'p2024.xlsx')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_cache_is_used(self):
+        parsed = schedule.parse_file(self.filename, self.tmp.name)
+
+        with unittest.mock.patch('xlrd.open_workbook', side_effect=AssertionError):
+            cached = schedule.parse_file(self.filename, self.tmp.name)
+
+        self.assertEqual(list(cached.keys()), list(parsed.keys()))
+        self.assertEqual(repr(cached), repr(parsed))
+
+    def test_cache_is_invalidated(self):
+        cache_file = os.path.join(self.tmp.name, 'cache')
+        key = ('file', 1, 1, 'hash')
+        schedule.save_cache(cache_file, key, {})
+
+        self.assertEqual(schedule.load_cache(cache_file, key), {})
+        self.assertIsNone(schedule.load_cache(cache_file, ('file', 1, 2, 'hash')))
+        self.assertIsNone(schedule.load_cache(os.path.join(self.tmp.name, 'nope'), key))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,13 +1,48 @@
 from __future__ import annotations
 import argparse
-import copy
+import array
+import asyncio
+import collections
+import contextlib
+import cProfile
+import concurrent.futures
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import math
+import multiprocessing
+import os
+import pickle
+import random
 import xlrd # pip install xlrd==1.2.0
 import tabulate
+import struct
 import sys
+import time
+import unicodedata
+import urllib.parse
+from collections.abc import Mapping
 from enum import Enum, auto
+from typing import Callable, Iterable, Iterator
+
+try:
+    import resource
+except ImportError: # not on Windows
+    resource = None
+
+try:
+    import numpy # optional, see `Catalog.available`
+except ImportError:
+    numpy = None
 
 VALID_DAYS = 'LAMJVS'
+DATA_EXTENSIONS = ('.xls', '.xlsx', '.csv', '.tsv')
+# columns stored as numbers in .xlsx files: NRC and Secc
+NUMERIC_COLUMNS = (0, 3)
 DAY_DICT = {
     'L' : 'Lunes',
     'A' : 'Martes',
@@ -24,6 +59,8 @@ class ConfigKey(Enum):
     COURSE_WHITELIST = auto()
     TIME_RESTRICTIONS = auto()
     CLASS_NAMES = auto()
+    OPTIONAL_NAMES = auto()
+    NAME_COUNT = auto()
 
 CONFIG_KEYS = {
     ConfigKey.PROFESSOR_BLACKLIST : 'sin-profesores',
@@ -32,9 +69,20 @@ CONFIG_KEYS = {
     ConfigKey.COURSE_WHITELIST : 'con-cursos',
     ConfigKey.TIME_RESTRICTIONS : 'sin-horarios',
     ConfigKey.CLASS_NAMES : 'materias',
+    # optional keys, see `optional_search`
+    ConfigKey.OPTIONAL_NAMES : 'materias-opcionales',
+    ConfigKey.NAME_COUNT : 'total-materias',
 }
 
+# hours shown in schedule tables
+TABLE_HOURS = range(7, 21)
+
 CONFIG_FILENAME = 'schedule-config.json'
+
+# parsed .xlsx files are stored here, see `parse_file`
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'schedule-maker')
+# bump when Course/CourseData change, so old caches aren't loaded
+CACHE_VERSION = 3
 CONFIG_BODY = {
     ConfigKey.CLASS_NAMES : ['Materia 1', 'Materia 2'],
     ConfigKey.PROFESSOR_BLACKLIST : ['Profesor 1', 'Profesor 2'],
@@ -50,16 +98,33 @@ CONFIG_BODY = {
     }
 }
 
+def to_minutes(time: int) -> int:
+    """
+    Converts an hhmm int (as stored in CourseData.time) to minutes since midnight.
+    """
+
+    return (time // 100) * 60 + time % 100
+
+def intern(s: any) -> any:
+    """
+    Interns `s` if it's a string, so repeated names, rooms, etc. are stored once.
+    """
+
+    return sys.intern(s) if type(s) is str else s
+
 class CourseData:
     """
     This class stores individual course's class time and classroom.
     It's basically a named tuple, but with time format conversion.
     """
 
+    __slots__ = ('time', 'mask', 'room', 'nrc')
+
     def __init__(self, time: str, room: str, nrc: str):
         self.time = self.parse_time(time)
-        self.room = room
-        self.nrc = nrc
+        self.mask = self.time_mask()
+        self.room = intern(room)
+        self.nrc = intern(nrc)
 
     def parse_time(self, time: str) -> tuple[int, int]:
         """
@@ -72,6 +137,16 @@ class CourseData:
 
         return val
 
+    def time_mask(self) -> int:
+        """
+        Returns this time block as a bitmask, one bit per minute of the day.
+        The range's end minute isn't set, so blocks that only share an
+        endpoint don't overlap, just like in `time_collision`.
+        """
+
+        start, end = map(to_minutes, self.time)
+        return ((1 << (end - start)) - 1) << start
+
     def time_collision(self, other: CourseData) -> bool:
         """
         Returns True only if this object's time collides with `schedule`'s time.
@@ -119,13 +194,16 @@ class Course:
     A Course's data.
     """
 
+    __slots__ = ('nrc', 'name', 'key', 'professor', 'section', 'schedule', 'masks')
+
     def __init__(self, nrc: str, key: str, name: str, sec: str, prof: str):
-        self.nrc = nrc
-        self.name = name
-        self.key = key
-        self.professor = prof
+        self.nrc = intern(nrc)
+        self.name = intern(name)
+        self.key = intern(key)
+        self.professor = intern(prof)
         self.section = sec
         self.schedule = {}
+        self.masks = {}
 
     # TODO: I don't like your name
     def add_class(self, day: str, time: str, room: str) -> bool:
@@ -145,15 +223,16 @@ class Course:
         # empty day, no problem
         if self.schedule.get(day, None) is None:
             self.schedule[day] = [cs]
+            self.masks[day] = cs.mask
             return True
 
         # check if classes collide
-        for c_sch in self.schedule[day]:
-            if c_sch.time_collision(cs):
-                return False
+        if self.masks[day] & cs.mask:
+            return False
 
         # no collisions, add schedule
         self.schedule[day].append(cs)
+        self.masks[day] |= cs.mask
 
         return True
 
@@ -167,12 +246,30 @@ class Course:
         if self.schedule.get(day, None) is None:
             return True
 
-        for t in self.schedule[day]:
-            for s in schedule:
-                if t.time_collision(s):
-                    return False
+        mask = 0
+        for s in schedule:
+            mask |= s.mask
 
-        return True
+        return not self.masks[day] & mask
+
+    def collides(self, other: Course) -> bool:
+        """
+        Checks if any of this course's time blocks collides with `other`'s.
+        """
+
+        for day, mask in self.masks.items():
+            if other.masks.get(day, 0) & mask:
+                return True
+
+        return False
+
+    def time_signature(self) -> tuple[tuple[str, int]]:
+        """
+        Returns a hashable value that's the same for courses
+        with exactly the same time blocks.
+        """
+
+        return tuple(sorted(self.masks.items()))
 
     def initials(self):
         """
@@ -189,20 +286,234 @@ class Course:
         s = f'{self.nrc}, {self.name}, {self.professor}\n'
         return s + '\n'.join(f'{key}: {self.schedule[key]}' for key in self.schedule.keys())
 
-def parse_file(filename: str) -> dict[str, Course]:
+def merge_ranges(ranges: list[str]) -> list[tuple[int, int]]:
     """
-    Parses .xlsx file and returns a dictionary [nrc -> Course].
-    This file has to have the same format as classes/p2024.xlsx.
+    Returns "hhmm-hhmm" `ranges` as sorted (start, end) tuples like CourseData.time,
+    with overlapping or touching ranges merged (see `CourseData.time_mask`).
     """
 
-    courses_by_nrc = {}
+    merged = []
+    for start, end in sorted(CourseData(r, None, None).time for r in ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+class Catalog(Mapping):
+    """
+    Compact, columnar storage for a whole catalog of courses.
+
+    Every time block is a row of flat arrays (course index, day, start, end
+    and room index, times in the "hhmm" ints of CourseData.time), and course
+    fields are stored once, in lists. Blocks of the i-th course are rows
+    offsets[i] to offsets[i + 1].
+
+    Works as a read-only dict[str, Course], but courses are built each time
+    they're accessed, so use a dict when every course is needed many times.
+    Whole-catalog time filters (`available`, `fits`) work straight on the
+    arrays, vectorized if NumPy is installed.
+    """
+
+    def __init__(self, courses_by_nrc: Mapping[str, Course] = {}):
+        self.nrcs = []
+        self.course_keys = []
+        self.names = []
+        self.sections = []
+        self.professors = []
+        self.rooms = []
+        self.index = {}
+
+        self.offsets = array.array('I', [0])
+        self.block_course = array.array('I')
+        self.block_day = array.array('B')
+        self.block_start = array.array('H')
+        self.block_end = array.array('H')
+        self.block_room = array.array('I')
+        self.minutes = None # see `block_minutes`
+
+        rooms = {}
+        for course in courses_by_nrc.values():
+            i = len(self.nrcs)
+            self.index[course.nrc] = i
+            self.nrcs.append(course.nrc)
+            self.course_keys.append(course.key)
+            self.names.append(course.name)
+            self.sections.append(course.section)
+            self.professors.append(course.professor)
+
+            for day, blocks in course.schedule.items():
+                for block in blocks:
+                    if block.room not in rooms:
+                        rooms[block.room] = len(self.rooms)
+                        self.rooms.append(block.room)
+
+                    self.block_course.append(i)
+                    self.block_day.append(VALID_DAYS.index(day))
+                    self.block_start.append(block.time[0])
+                    self.block_end.append(block.time[1])
+                    self.block_room.append(rooms[block.room])
+
+            self.offsets.append(len(self.block_course))
+
+    def course(self, i: int) -> Course:
+        """
+        Builds the i-th course.
+        """
+
+        course = Course(
+            self.nrcs[i], self.course_keys[i], self.names[i], self.sections[i], self.professors[i]
+        )
+
+        for b in range(self.offsets[i], self.offsets[i + 1]):
+            course.add_class(
+                VALID_DAYS[self.block_day[b]],
+                f'{self.block_start[b]:04}-{self.block_end[b]:04}',
+                self.rooms[self.block_room[b]]
+            )
+
+        return course
+
+    def block_minutes(self) -> tuple:
+        """
+        Returns the day, start and end of every block, times in minutes
+        (see `to_minutes`), as NumPy arrays. Only built once.
+        """
+
+        if self.minutes is None:
+            start = numpy.frombuffer(self.block_start, dtype=numpy.uint16).astype(numpy.int32)
+            end = numpy.frombuffer(self.block_end, dtype=numpy.uint16).astype(numpy.int32)
+            self.minutes = (
+                numpy.frombuffer(self.block_day, dtype=numpy.uint8),
+                start // 100 * 60 + start % 100,
+                end // 100 * 60 + end % 100,
+            )
+
+        return self.minutes
+
+    def ranges(self, time_ranges: dict[str, list[str]]) -> list[tuple[int, int, int]]:
+        """
+        Returns "hhmm-hhmm" ranges by day as (day index, start, end) tuples,
+        in minutes, merged like `merge_ranges`.
+        """
+
+        return [
+            (VALID_DAYS.index(day), to_minutes(start), to_minutes(end))
+            for day, ranges in time_ranges.items() if day in VALID_DAYS
+            for start, end in merge_ranges(ranges)
+        ]
+
+    def available(self, time_restrictions: dict[str, list[str]]) -> list[bool]:
+        """
+        Returns, for each course, if none of its blocks collide with `time_restrictions`
+        (like the ones of `collect_courses`). With NumPy, every block is checked
+        against every restriction at once.
+        """
+
+        ranges = self.ranges(time_restrictions)
+
+        if numpy is not None:
+            day, start, end = self.block_minutes()
+            r = numpy.array(ranges, dtype=numpy.int32).reshape(-1, 3)
+            hit = (
+                (day[:, None] == r[:, 0]) & (start[:, None] < r[:, 2]) & (r[:, 1] < end[:, None])
+            ).any(axis=1)
+            course = numpy.frombuffer(self.block_course, dtype=numpy.uint32)
+
+            return (numpy.bincount(course[hit], minlength=len(self)) == 0).tolist()
+
+        restricted = [0] * len(VALID_DAYS)
+        for day, start, end in ranges:
+            restricted[day] |= ((1 << (end - start)) - 1) << start
+
+        result = [True] * len(self)
+        for b, course in enumerate(self.block_course):
+            start, end = to_minutes(self.block_start[b]), to_minutes(self.block_end[b])
+            if restricted[self.block_day[b]] >> start & ((1 << (end - start)) - 1):
+                result[course] = False
 
-    d = xlrd.open_workbook(filename)
-    sheet = d.sheet_by_index(0)
+        return result
 
-    for r in range(1, sheet.nrows):
-        row = [sheet.cell_value(r, c) for c in range(sheet.ncols)]
-        nrc, key, name, sec, day, time, prof, room, _ = row
+    def fits(self, free_time: dict[str, list[str]]) -> list[bool]:
+        """
+        Returns, for each course, if all of its blocks are inside the
+        ranges of `free_time`, e.g. {'L' : ['0700-1259']}.
+        Days without ranges have no free time.
+        """
+
+        ranges = self.ranges(free_time)
+
+        if numpy is not None:
+            day, start, end = self.block_minutes()
+            r = numpy.array(ranges, dtype=numpy.int32).reshape(-1, 3)
+            inside = (
+                (day[:, None] == r[:, 0]) & (r[:, 1] <= start[:, None]) & (end[:, None] <= r[:, 2])
+            ).any(axis=1)
+            course = numpy.frombuffer(self.block_course, dtype=numpy.uint32)
+
+            return (numpy.bincount(course[~inside], minlength=len(self)) == 0).tolist()
+
+        free = [0] * len(VALID_DAYS)
+        for day, start, end in ranges:
+            free[day] |= ((1 << (end - start)) - 1) << start
+
+        result = [True] * len(self)
+        for b, course in enumerate(self.block_course):
+            start, end = to_minutes(self.block_start[b]), to_minutes(self.block_end[b])
+            if ~free[self.block_day[b]] >> start & ((1 << (end - start)) - 1):
+                result[course] = False
+
+        return result
+
+    def __getitem__(self, nrc: str) -> Course:
+        return self.course(self.index[nrc])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.nrcs)
+
+    def __len__(self) -> int:
+        return len(self.nrcs)
+
+class CourseIndex(dict):
+    """
+    dict[nrc -> Course] that also has its courses by name and by professor,
+    in the same order, so `collect_courses` doesn't go through every course.
+    `parse_file` returns one. Don't modify it after it's built.
+    """
+
+    def __init__(self, courses_by_nrc: Mapping[str, Course] = {}):
+        super().__init__(courses_by_nrc)
+        self.by_name = {}
+        self.by_professor = {}
+
+        for course in self.values():
+            self.by_name.setdefault(course.name, []).append(course)
+            self.by_professor.setdefault(course.professor, []).append(course)
+
+def parse_file(filename: str, cache_dir: str = None) -> CourseIndex:
+    """
+    Parses a data file and returns a dictionary [nrc -> Course], with indexes (see `CourseIndex`).
+    This file has to have the same format as classes/p2024.xlsx,
+    see `iter_rows` for the supported file types.
+
+    If `cache_dir` is given, the parsed courses are stored there and loaded
+    instead of parsing again, as long as the file doesn't change.
+    """
+
+    if cache_dir is not None:
+        key = cache_key(filename)
+        cache_file = os.path.join(cache_dir, hashlib.sha256(key[0].encode()).hexdigest())
+
+        courses_by_nrc = load_cache(cache_file, key)
+        if courses_by_nrc is not None:
+            return courses_by_nrc
+
+    courses_by_nrc = {}
+
+    for row in iter_rows(filename):
+        # the last column has no header and is often left out of exports
+        nrc, key, name, sec, day, time, prof, room = row[:8]
         nrc = str(int(nrc))
 
         if courses_by_nrc.get(nrc, None) is None:
@@ -210,47 +521,165 @@ def parse_file(filename: str) -> dict[str, Course]:
 
         courses_by_nrc[nrc].add_class(day, time, room)
 
+    courses_by_nrc = CourseIndex(courses_by_nrc)
+
+    if cache_dir is not None:
+        save_cache(cache_file, cache_key(filename), courses_by_nrc)
+
+    return courses_by_nrc
+
+def iter_rows(filename: str) -> Iterator[list]:
+    """
+    Yields the rows of a data file, without headers.
+
+    .xls/.xlsx files are read a whole row at a time, from every sheet (each
+    with its own header), loading only one sheet at a time.
+    .csv/.tsv files are streamed. Numeric columns are converted to floats,
+    so rows are the same as for the same data in a .xlsx file.
+    """
+
+    if filename.endswith('.csv') or filename.endswith('.tsv'):
+        delimiter = '\t' if filename.endswith('.tsv') else ','
+
+        with open(filename, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            next(reader, None)
+
+            for row in reader:
+                if not row:
+                    continue
+
+                for c in NUMERIC_COLUMNS:
+                    try:
+                        row[c] = float(row[c])
+                    except ValueError:
+                        pass
+
+                yield row
+
+        return
+
+    d = xlrd.open_workbook(filename, on_demand=True)
+    try:
+        for i in range(d.nsheets):
+            sheet = d.sheet_by_index(i)
+            for r in range(1, sheet.nrows):
+                yield sheet.row_values(r)
+
+            d.unload_sheet(i)
+    finally:
+        d.release_resources()
+
+def cache_key(filename: str) -> tuple[str, int, int, str]:
+    """
+    Returns what identifies a version of a file: its path, size,
+    modification time and content hash.
+    """
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    return (path, stat.st_size, stat.st_mtime_ns, digest)
+
+def load_cache(cache_file: str, key: tuple) -> dict[str, Course] | None:
+    """
+    Loads parsed courses from `cache_file`.
+    Returns None if there's no cache, or if it isn't for `key`.
+    """
+
+    try:
+        with open(cache_file, 'rb') as f:
+            version, cached_key, courses_by_nrc = pickle.load(f)
+    except Exception:
+        return None
+
+    if version != CACHE_VERSION or cached_key != key:
+        return None
+
     return courses_by_nrc
 
+def save_cache(cache_file: str, key: tuple, courses_by_nrc: dict[str, Course]):
+    """
+    Stores parsed courses in `cache_file`. Failing to do so isn't an error,
+    the file will just be parsed again next time.
+    """
+
+    tmp = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump((CACHE_VERSION, key, courses_by_nrc), f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, cache_file)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
 def collect_courses(
         courses_by_nrc: dict[str, Course],
         names: list[str],
         professor_blacklist: list[str] = [],
         course_blacklist: list[int] = [],
         time_restrictions: dict[str, list[str]] = {},
+        course_whitelist: list[str] = [],
 ) -> dict[str, list[Course]]:
     """
-    Gets all relevant courses considering filters:
+    Gets all relevant courses considering filters, looking only at the
+    courses of `names` (see `CourseIndex`):
         - names: the names of the courses
         - prof_blacklist: unwanted professors
         - time_restrictions: unwanted time blocks
         - course-blacklist: unwanted courses (nrc)
+        - course-whitelist: wanted courses (nrc), pins their course name
+          to that course. If they can't all be pinned, every list is empty.
     """
 
-    professor_blacklist = set(professor_blacklist)
-    course_blacklist = set(course_blacklist)
+    index = courses_by_nrc if isinstance(courses_by_nrc, CourseIndex) else CourseIndex(courses_by_nrc)
 
-    courses = {name : [] for name in names}
-    time_restrictions = {
-        key : [CourseData(s, '...', 0) for s in time_restrictions[key]]
-        for key in time_restrictions.keys()
-    }
+    # nrcs of black-listed courses and of every course of black-listed professors
+    course_blacklist = set(course_blacklist)
+    for prof in professor_blacklist:
+        course_blacklist.update(c.nrc for c in index.by_professor.get(prof, []))
 
-    for nrc in courses_by_nrc.keys():
-        course = courses_by_nrc[nrc]
-        prof_blacklist = course.professor in professor_blacklist
-        nrc_blacklist = course.nrc in course_blacklist
-        not_blacklist = not (prof_blacklist or nrc_blacklist)
+    # unwanted minutes of each day, see `CourseData.time_mask`
+    restricted = {}
+    for day, ranges in time_restrictions.items():
+        mask = 0
+        for s in ranges:
+            mask |= CourseData(s, '...', 0).mask
 
-        time_available = True
-        for day in course.schedule.keys():
-            if time_restrictions.get(day, None):
-                if not course.time_available(day, time_restrictions[day]):
-                    time_available = False
-                    break
+        if mask:
+            restricted[day] = mask
 
-        if course.name in names and not_blacklist and time_available:
-            courses[course.name].append(course)
+    courses = {name : [] for name in names}
+    for name in courses:
+        courses[name] = [
+            course for course in index.by_name.get(name, [])
+            if course.nrc not in course_blacklist and not any(
+                course.masks.get(day, 0) & mask for day, mask in restricted.items()
+            )
+        ]
+
+    # pin white-listed courses
+    course_whitelist = set(course_whitelist)
+    pinned = 0
+    for name in courses:
+        wanted = [c for c in courses[name] if c.nrc in course_whitelist]
+
+        # a schedule can only have one course of each name
+        if len(wanted) > 1:
+            return {name : [] for name in names}
+
+        if wanted:
+            courses[name] = wanted
+            pinned += 1
+
+    # some white-listed course was filtered out (or isn't in `names`)
+    if pinned < len(course_whitelist):
+        return {name : [] for name in names}
 
     return courses
 
@@ -261,22 +690,18 @@ class SchedulePrototype:
 
     def __init__(self):
         self.schedule = {}
+        self.masks = {}
         self.nrcs = []
 
     def can_add_course(self, course: Course) -> bool:
         """
         Checks if a course's time blocks don't collide with existing ones.
+        Only one AND per day, using the occupied minutes mask.
         """
 
-        for day in course.schedule.keys():
-            # day not in schedule, no collision
-            if self.schedule.get(day, None) is None:
-                continue
-            else:
-                for sp_time_block in self.schedule[day]:
-                    for c_time_block in course.schedule[day]:
-                        if sp_time_block.time_collision(c_time_block):
-                            return False
+        for day, mask in course.masks.items():
+            if self.masks.get(day, 0) & mask:
+                return False
 
         return True
 
@@ -291,8 +716,51 @@ class SchedulePrototype:
         for day in course.schedule.keys():
             if self.schedule.get(day, None) is None:
                 self.schedule[day] = []
+                self.masks[day] = 0
 
             self.schedule[day].extend(course.schedule[day])
+            self.masks[day] |= course.masks[day]
+
+    def remove_course(self, course: Course):
+        """
+        Undoes `add_course`. `course` has to be the last course added.
+        """
+
+        self.nrcs.pop()
+
+        for day, blocks in course.schedule.items():
+            del self.schedule[day][-len(blocks):]
+            self.masks[day] &= ~course.masks[day]
+
+            # keep days without classes out of the table
+            if not self.schedule[day]:
+                del self.schedule[day]
+                del self.masks[day]
+
+    @classmethod
+    def from_nrcs(cls, nrcs: tuple[str], courses_by_nrc: dict[str, Course]) -> SchedulePrototype:
+        """
+        Builds a schedule from a combination of nrcs, as produced by `combine_r`.
+        """
+
+        prot = cls()
+        for nrc in nrcs:
+            prot.add_course(courses_by_nrc[nrc])
+
+        return prot
+
+    def copy(self) -> SchedulePrototype:
+        """
+        Returns a copy that can be modified without changing this one.
+        Time blocks are shared, they're never modified.
+        """
+
+        prot = SchedulePrototype()
+        prot.schedule = {day : list(blocks) for day, blocks in self.schedule.items()}
+        prot.masks = dict(self.masks)
+        prot.nrcs = list(self.nrcs)
+
+        return prot
 
     def sort(self) -> SchedulePrototype:
         """
@@ -337,11 +805,11 @@ class SchedulePrototype:
 
         keys = [day for day in VALID_DAYS if day in self.schedule.keys()]
         headers = ['Horario'] + [DAY_DICT[day] for day in keys]
-        ranges = [CourseData(f'{i:>02}00-{i:>02}59', None, None) for i in range(7, 21)]
+        ranges = [CourseData(f'{i:>02}00-{i:>02}59', None, None) for i in TABLE_HOURS]
 
         rows = []
         for r in ranges:
-            row = [r.pretty_format()] + [None] * 5
+            row = [r.pretty_format()] + [None] * max(5, len(keys))
             for i, day in enumerate(keys):
                 for t in self.schedule[day]:
                     if r.time_collision(t):
@@ -352,9 +820,11 @@ class SchedulePrototype:
 
         return tabulate.tabulate(rows, headers=headers)
 
-    def show(self, courses_by_nrc: dict[str, Course]):
+    def show(self, courses_by_nrc: dict[str, Course], groups: tuple[tuple[str]] = None):
         """
         Prints course nrc, names and professor as well as the table.
+        If `groups` is given (see `iter_schedule_groups`), every nrc
+        and professor of each group is printed.
         Output looks like this:
         ```txt
         58469  [RI]    Redes Inalambricas              SORIANO - ROSAS JOSE ISABEL
@@ -384,107 +854,2586 @@ class SchedulePrototype:
         """
 
         data = []
-        for nrc in self.nrcs:
-            course = courses_by_nrc[nrc]
-            data.append([nrc, f'[{course.initials()}]', f'{course.name}', course.professor])
+        for nrcs in groups if groups else ((nrc,) for nrc in self.nrcs):
+            course = courses_by_nrc[nrcs[0]]
+            professors = dict.fromkeys(courses_by_nrc[nrc].professor for nrc in nrcs)
+            data.append([
+                '/'.join(nrcs),
+                f'[{course.initials()}]',
+                f'{course.name}',
+                ' / '.join(professors)
+            ])
 
         print(tabulate.tabulate(data, tablefmt='plain') + '\n')
         print(self.table(courses_by_nrc))
         print('\n\n\n')
 
-def combine_r(
-        prot: SchedulePrototype,
-        possibilities: list[list[Course]],
-        combinations: list[SchedulePrototype]
-    ):
+def format_table(rows: list[list], headers: list[str] = None) -> str:
     """
-    Recursive method. Gets all possible schedule combinations given `possibilities`.
-    Stores them in `combinations`.
+    Same as `tabulate.tabulate(rows, headers=headers)`, or with
+    tablefmt='plain' if there are no headers, for rows of strings or None.
+    Much faster, but only handles cells it can lay out exactly like tabulate
+    (no numbers other than plain digits, line breaks or wide characters),
+    and leaves the rest to tabulate.
     """
 
-    if len(possibilities) == 0:
-        combinations.append(prot)
-        return
+    columns = len(rows[0]) if rows else 0
+    if any(len(row) != columns for row in rows) or (headers and len(headers) > columns):
+        return _tabulate(rows, headers)
+
+    widths = [len(h) + 2 for h in [''] * (columns - len(headers)) + headers] if headers else [0] * columns
+    numeric = [True] * columns
 
-    next_pos = possibilities[1:]
-    for p in possibilities[0]:
-        if prot.can_add_course(p):
-            child = copy.deepcopy(prot)
-            child.add_course(p)
+    for row in rows:
+        for c, cell in enumerate(row):
+            if cell is None:
+                continue
 
-            combine_r(child, next_pos, combinations)
+            if type(cell) is not str or not _plain_cell(cell):
+                return _tabulate(rows, headers)
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('data')
-    parser.add_argument('-c', '--config')
-    args = parser.parse_args()
+            if not (cell.isascii() and cell.isdigit()):
+                numeric[c] = False
 
-    if not args.data.endswith('.xlsx') and not args.data.endswith('.xls'):
-        print('Schedule data file must be .xls/.xlsx termina.')
-        exit(1)
+            if len(cell) > widths[c]:
+                widths[c] = len(cell)
 
-    config_file = args.config if args.config else CONFIG_FILENAME
+    # columns without any cell are strings
+    for c in range(columns):
+        if all(row[c] is None for row in rows):
+            numeric[c] = False
 
-    try:
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-    except Exception as e:
-        print(f'No config file found. Creating {CONFIG_FILENAME}')
+    lines = []
+    if headers:
+        headers = [''] * (columns - len(headers)) + headers
+        lines.append('  '.join(
+            h.rjust(w) if num else h.ljust(w) for h, w, num in zip(headers, widths, numeric)
+        ).rstrip())
+        lines.append('  '.join('-' * w for w in widths))
 
-        with open(CONFIG_FILENAME, 'w') as c:
-            c.write(json.dumps(CONFIG_BODY, indent=4))
+    for row in rows:
+        lines.append('  '.join(
+            ''.ljust(w) if cell is None else cell.rjust(w) if num else cell.ljust(w)
+            for cell, w, num in zip(row, widths, numeric)
+        ).rstrip())
 
-        exit(1)
+    return '\n'.join(lines)
 
-    courses_by_nrc = parse_file(args.data)
+def _tabulate(rows: list[list], headers: list[str] = None) -> str:
+    if headers:
+        return tabulate.tabulate(rows, headers=headers)
 
-    try:
-        courses_by_name = collect_courses(
-            courses_by_nrc,
-            config[CONFIG_KEYS[ConfigKey.CLASS_NAMES]],
-            professor_blacklist=config[CONFIG_KEYS[ConfigKey.PROFESSOR_BLACKLIST]],
-            course_blacklist=config[CONFIG_KEYS[ConfigKey.COURSE_BLACKLIST]],
-            time_restrictions=config[CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS]]
-        )
-    except KeyError as e:
-        print(
-            f'Key "{e.args[0]}" not found. Make sure to update `{config_file}`.',
-            file=sys.stderr
-        )
-        exit(1)
+    return tabulate.tabulate(rows, tablefmt='plain')
+
+def _plain_cell(cell: str) -> bool:
+    """
+    Checks if tabulate would show `cell` as a plain, one character wide per
+    character, string (or as an int, if it's only digits). Cells tabulate
+    reads as numbers or booleans aren't plain.
+    """
 
-    c = list(courses_by_name.values())
-    combinations = []
-    combine_r(SchedulePrototype(), c, combinations)
+    if cell.isascii():
+        if cell.isdigit():
+            return True
+    elif any(unicodedata.combining(c) or unicodedata.east_asian_width(c) in 'WF' for c in cell):
+        return False
+
+    if '\n' in cell or cell != cell.strip() or cell in ('True', 'False'):
+        return False
 
-    # filter out non white-listed courses and professors
+    # tabulate also reads numbers with thousands separators, e.g. "1,000"
     try:
-        rem = []
-        for i, prot in enumerate(combinations):
-            b = False
-            for course in config[CONFIG_KEYS[ConfigKey.COURSE_WHITELIST]]:
-                if course not in prot.nrcs:
-                    rem.append(i)
-                    b = True
-                    break
+        float(cell.replace(',', ''))
+    except ValueError:
+        return True
 
-            if b: continue
+    return False
 
-            professors = prot.get_professors(courses_by_nrc)
-            for prof in config[CONFIG_KEYS[ConfigKey.PROFESSOR_WHITELIST]]:
-                if prof not in professors:
-                    rem.append(i)
-                    break
-    except KeyError as e:
-        print(
-            f'Key "{e.args[0]}" not found. Make sure to update `{config_file}`.',
-            file=sys.stderr
+class ScheduleWriter:
+    """
+    Writes schedules exactly like `SchedulePrototype.show` prints them, but
+    faster: initials are computed once per course, tables are filled straight
+    from each time block's start and end (see `format_table`), and text is
+    written to `file` in batches of about `buffer_size` characters.
+    Call `flush` when done.
+    """
+
+    # (first, last) minute and label of each table row
+    hours = [
+        (to_minutes(r.time[0]), to_minutes(r.time[1]), r.pretty_format())
+        for r in (CourseData(f'{i:>02}00-{i:>02}59', None, None) for i in TABLE_HOURS)
+    ]
+
+    def __init__(self, courses_by_nrc: dict[str, Course], file=None, buffer_size: int = 1 << 16):
+        self.courses_by_nrc = courses_by_nrc
+        self.file = file if file is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.initials = {}
+
+    def course_initials(self, nrc: str) -> str:
+        initials = self.initials.get(nrc, None)
+        if initials is None:
+            initials = self.initials[nrc] = self.courses_by_nrc[nrc].initials()
+
+        return initials
+
+    def table(self, prot: SchedulePrototype) -> str:
+        """
+        Same as `prot.table`.
+        """
+
+        keys = [day for day in VALID_DAYS if day in prot.schedule]
+        headers = ['Horario'] + [DAY_DICT[day] for day in keys]
+        rows = [[label] + [None] * max(5, len(keys)) for _, _, label in self.hours]
+
+        for i, day in enumerate(keys):
+            for block in prot.schedule[day]:
+                start, end = map(to_minutes, block.time)
+                initials = None
+
+                # the first block that collides with an hour is shown
+                for row, (first, last, _) in zip(rows, self.hours):
+                    if start < last and first < end and row[i + 1] is None:
+                        if initials is None:
+                            initials = self.course_initials(block.nrc)
+
+                        row[i + 1] = initials
+
+        return format_table(rows, headers)
+
+    def render(self, prot: SchedulePrototype, groups: tuple[tuple[str]] = None) -> str:
+        """
+        Returns what `prot.show(courses_by_nrc, groups)` prints.
+        """
+
+        data = []
+        for nrcs in groups if groups else ((nrc,) for nrc in prot.nrcs):
+            course = self.courses_by_nrc[nrcs[0]]
+            professors = dict.fromkeys(self.courses_by_nrc[nrc].professor for nrc in nrcs)
+            data.append([
+                '/'.join(nrcs),
+                f'[{self.course_initials(nrcs[0])}]',
+                f'{course.name}',
+                ' / '.join(professors)
+            ])
+
+        return f'{format_table(data)}\n\n{self.table(prot)}\n\n\n\n\n'
+
+    def write(self, prot: SchedulePrototype, groups: tuple[tuple[str]] = None):
+        text = self.render(prot, groups)
+        self.buffer.append(text)
+        self.buffered += len(text)
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.file.flush()
+        self.buffer.clear()
+        self.buffered = 0
+
+class JsonLinesWriter:
+    """
+    Writes one JSON object per line and schedule:
+    ```json
+    {"nrcs": ["58469", "55098"], "days": {"L": [{"nrc": "58469", "time": "0700-0859", "room": "..."}]}}
+    ```
+    With groups, "nrcs" has a list of nrcs for each name, and blocks
+    have the first nrc of their group.
+    Same interface as `ScheduleWriter`.
+    """
+
+    def __init__(self, file=None, buffer_size: int = 1 << 16):
+        self.file = file if file is not None else sys.stdout
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+
+    def render(self, prot: SchedulePrototype, groups: tuple[tuple[str]] = None) -> str:
+        days = {}
+        for day in VALID_DAYS:
+            if day in prot.schedule:
+                days[day] = [
+                    {'nrc' : b.nrc, 'time' : f'{b.time[0]:04}-{b.time[1]:04}', 'room' : b.room}
+                    for b in sorted(prot.schedule[day], key=lambda b: b.time)
+                ]
+
+        nrcs = [list(g) for g in groups] if groups else prot.nrcs
+        return json.dumps({'nrcs' : nrcs, 'days' : days}, ensure_ascii=False) + '\n'
+
+    def write(self, prot: SchedulePrototype, groups: tuple[tuple[str]] = None):
+        text = self.render(prot, groups)
+        self.buffer.append(text)
+        self.buffered += len(text)
+
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.file.flush()
+        self.buffer.clear()
+        self.buffered = 0
+
+class BinaryWriter:
+    """
+    Writes schedules as fixed size records of indexes into a table of nrcs,
+    written once in the header. `file` has to be a binary file.
+
+    Layout (little endian):
+        - BINARY_MAGIC
+        - uint32 header length, then the header as UTF-8 JSON:
+          {"nrcs": [...], "width": names per schedule, "index": "H" or "I"}
+        - a record of `width` uint16 ("H") or uint32 ("I") per schedule
+
+    Same interface as `ScheduleWriter`, but groups aren't supported.
+    See `read_binary`.
+    """
+
+    def __init__(self, nrcs: list[str], width: int, file=None, buffer_size: int = 1 << 16):
+        self.file = file if file is not None else sys.stdout.buffer
+        self.buffer_size = buffer_size
+        self.index = {nrc : i for i, nrc in enumerate(nrcs)}
+        self.record = struct.Struct(f'<{width}{"H" if len(nrcs) <= 0xffff else "I"}')
+        self.buffer = bytearray()
+
+        header = json.dumps({
+            'nrcs' : list(nrcs),
+            'width' : width,
+            'index' : self.record.format[-1]
+        }).encode()
+        self.buffer += BINARY_MAGIC + struct.pack('<I', len(header)) + header
+
+    def write(self, prot: SchedulePrototype, groups: tuple[tuple[str]] = None):
+        assert groups is None, 'groups can\'t be written as binary'
+
+        self.buffer += self.record.pack(*(self.index[nrc] for nrc in prot.nrcs))
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer.clear()
+
+def read_binary(file) -> Iterator[tuple[str]]:
+    """
+    Yields the schedules (tuples of nrcs) in a file written by `BinaryWriter`.
+    """
+
+    if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError('not a schedule binary file')
+
+    length, = struct.unpack('<I', file.read(4))
+    header = json.loads(file.read(length))
+    nrcs = header['nrcs']
+    record = struct.Struct(f'<{header["width"]}{header["index"]}')
+
+    # schedules without names take no space, they can't be counted
+    if record.size == 0:
+        return
+
+    while chunk := file.read(record.size * 4096):
+        for indexes in record.iter_unpack(chunk):
+            yield tuple(nrcs[i] for i in indexes)
+
+BINARY_MAGIC = b'SCHD\x01'
+
+OUTPUT_FORMATS = ('text', 'jsonl', 'binary')
+
+class Score:
+    """
+    A way to rank schedules: `function` takes a SchedulePrototype and returns
+    a comparable value, lower is better.
+
+    Scores are `monotone` if adding courses never makes them better. Then a
+    partial schedule's score is a bound for every schedule built from it,
+    and ranking can skip whole branches.
+    """
+
+    def __init__(self, function: Callable[[SchedulePrototype], any], monotone: bool = False):
+        self.function = function
+        self.monotone = monotone
+
+    def __call__(self, prot: SchedulePrototype) -> any:
+        return self.function(prot)
+
+    @classmethod
+    def combine(cls, scores: list[Score]) -> Score:
+        """
+        Returns a score that compares schedules by each of `scores`, in order.
+        """
+
+        return cls(
+            lambda prot: tuple(score(prot) for score in scores),
+            all(score.monotone for score in scores)
         )
-        exit(1)
 
-    for i in reversed(rem):
-        combinations.pop(i)
+def idle_minutes(prot: SchedulePrototype) -> int:
+    """
+    Returns the total minutes between classes, on every day.
+    """
+
+    return sum(m.bit_length() - (m & -m).bit_length() + 1 - m.bit_count() for m in prot.masks.values())
 
-    for prot in combinations:
-        prot.show(courses_by_nrc)
+def class_days(prot: SchedulePrototype) -> int:
+    """
+    Returns the number of days with classes.
+    """
+
+    return len(prot.masks)
+
+def early_start(prot: SchedulePrototype) -> int:
+    """
+    Returns how many minutes before midnight the earliest class starts,
+    so that starting later is better.
+    """
+
+    return max((24 * 60 - (m & -m).bit_length() + 1 for m in prot.masks.values()), default=0)
+
+def late_end(prot: SchedulePrototype) -> int:
+    """
+    Returns the minute the latest class ends.
+    """
+
+    return max((m.bit_length() for m in prot.masks.values()), default=0)
+
+SCORES = {
+    'gaps' : Score(idle_minutes),
+    'days' : Score(class_days, monotone=True),
+    'start' : Score(early_start, monotone=True),
+    'end' : Score(late_end, monotone=True),
+}
+
+class SearchOrder(Enum):
+    STATIC = auto() # names in the order they were given
+    MRV = auto()    # name with the fewest compatible courses left first
+
+SEARCH_ORDERS = {
+    'static' : SearchOrder.STATIC,
+    'mrv' : SearchOrder.MRV,
+}
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """
+    Yields the indexes of the set bits in `bits`, lowest first.
+    """
+
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+class CompatibilityMatrix:
+    """
+    Pairwise compatibility between all candidate courses, computed once
+    before searching.
+
+    Courses are numbered in `possibilities` order, and sets of courses are
+    int bitsets where bit i is the i-th course:
+        - domains[k]: courses of the k-th name
+        - compatible[i]: courses that don't collide with the i-th course
+    """
+
+    def __init__(self, possibilities: list[list[Course]]):
+        self.courses = [course for courses in possibilities for course in courses]
+        self.domains = []
+
+        start = 0
+        for courses in possibilities:
+            self.domains.append(((1 << len(courses)) - 1) << start)
+            start += len(courses)
+
+        everything = (1 << len(self.courses)) - 1
+        self.compatible = [everything] * len(self.courses)
+
+        for i, a in enumerate(self.courses):
+            for j in range(i + 1, len(self.courses)):
+                if a.collides(self.courses[j]):
+                    self.compatible[i] &= ~(1 << j)
+                    self.compatible[j] &= ~(1 << i)
+
+    def bitset(self, predicate: Callable[[Course], bool]) -> int:
+        """
+        Returns the set of courses for which `predicate` is True.
+        """
+
+        return sum(1 << i for i, course in enumerate(self.courses) if predicate(course))
+
+def group_by_time(courses: list[Course], professor_whitelist: list[str] = []) -> list[list[Course]]:
+    """
+    Groups courses with exactly the same time blocks, keeping their order.
+    Courses from white-listed professors are only grouped with courses from
+    the same professor, so every course in a group is interchangeable.
+    """
+
+    groups = {}
+    for course in courses:
+        prof = course.professor if course.professor in professor_whitelist else None
+        groups.setdefault((course.time_signature(), prof), []).append(course)
+
+    return list(groups.values())
+
+class ScheduleSearch:
+    """
+    Search over schedule combinations given `possibilities`.
+
+    Courses with the same time blocks are grouped (see `group_by_time`) and
+    searched only once. Each schedule is a tuple with, for each name, the
+    nrcs of the interchangeable courses, e.g. (('1234', '5678'), ('4321',)).
+    Names are always in `possibilities` order, whatever `order` the search follows.
+
+    Uses forward checking: once a group is picked, the remaining names only
+    keep the groups compatible with it, and the branch is dropped as soon as
+    any of them runs out of groups.
+
+    Only schedules with classes from every professor in `professor_whitelist`
+    are found. Branches where some of them can't show up anymore are pruned.
+
+    If `prot` is given, schedules are built on top of it (it isn't modified).
+
+    A node of the search tree is a tuple (chosen, domains, missing):
+        - chosen: nrcs of the picked group of each name, None if not picked yet
+        - domains: name index -> groups still compatible, for names not picked
+        - missing: white-listed professors not in the schedule yet
+    """
+
+    def __init__(
+            self,
+            possibilities: list[list[Course]],
+            prot: SchedulePrototype = None,
+            professor_whitelist: list[str] = [],
+            order: SearchOrder = SearchOrder.MRV,
+        ):
+        self.groups = [group_by_time(courses, professor_whitelist) for courses in possibilities]
+        self.matrix = CompatibilityMatrix([[g[0] for g in gs] for gs in self.groups])
+        self.nrcs = [tuple(c.nrc for c in g) for gs in self.groups for g in gs]
+        self.order = order
+        self.prefix = ()
+        self.prot = prot
+
+        domains = self.matrix.domains
+        if prot is not None:
+            self.prefix = tuple((nrc,) for nrc in prot.nrcs)
+            fits = self.matrix.bitset(prot.can_add_course)
+            domains = [d & fits for d in domains]
+
+        self.teaches = {
+            prof : self.matrix.bitset(lambda c: c.professor == prof)
+            for prof in professor_whitelist
+        }
+        self.root = (
+            (None,) * len(possibilities),
+            dict(enumerate(domains)) if all(domains) else None,
+            frozenset(professor_whitelist)
+        )
+
+    def viable(self, domains: dict[int, int], missing: frozenset[str]) -> bool:
+        """
+        Checks if every missing professor can still show up.
+        """
+
+        for prof in missing:
+            if not any(self.teaches[prof] & d for d in domains.values()):
+                return False
+
+        return True
+
+    def pick(self, domains: dict[int, int]) -> int:
+        """
+        Returns the index of the next name to branch on, following `self.order`.
+        """
+
+        if self.order == SearchOrder.MRV:
+            return min(domains, key=lambda k: domains[k].bit_count())
+
+        return next(iter(domains))
+
+    def branches(self, domains: dict[int, int]) -> Iterator[tuple[int, int, dict[int, int]]]:
+        """
+        Picks the next name to branch on (see `pick`), and yields
+        (name index, group index, remaining domains) for each of its groups
+        that doesn't leave another name without groups.
+        """
+
+        k = self.pick(domains)
+
+        for i in iter_bits(domains[k]):
+            compatible = self.matrix.compatible[i]
+            remaining = {j : d & compatible for j, d in domains.items() if j != k}
+
+            if all(remaining.values()):
+                yield k, i, remaining
+
+    def search(
+            self,
+            chosen: list[tuple[str]],
+            domains: dict[int, int],
+            missing: frozenset[str]
+        ) -> Iterator[tuple[tuple[str]]]:
+        """
+        Recursive method. Yields every schedule under a node.
+        `chosen` is modified in place.
+        """
+
+        if missing and not self.viable(domains, missing):
+            return
+
+        if not domains:
+            yield self.prefix + tuple(chosen)
+            return
+
+        for k, i, remaining in self.branches(domains):
+            chosen[k] = self.nrcs[i]
+            yield from self.search(chosen, remaining, missing - {self.matrix.courses[i].professor})
+
+    def __iter__(self) -> Iterator[tuple[tuple[str]]]:
+        return self.run(self.root)
+
+    def run(self, node: tuple) -> Iterator[tuple[tuple[str]]]:
+        """
+        Yields every schedule under `node`.
+        """
+
+        chosen, domains, missing = node
+        if domains is not None:
+            yield from self.search(list(chosen), domains, missing)
+
+    def count(self, node: tuple = None, grouped: bool = False) -> int:
+        """
+        Returns how many schedules there are under `node` (the root by default),
+        without building them. Unless `grouped`, every course of a group counts.
+        """
+
+        chosen, domains, missing = node if node else self.root
+        if domains is None:
+            return 0
+
+        return self.counter(grouped)(domains, missing)
+
+    def counter(self, grouped: bool = False) -> Callable[[dict[int, int], frozenset[str]], int]:
+        """
+        Returns a function that counts the schedules under some domains and
+        missing professors (see `count`).
+
+        The remaining domains and missing professors are all that matters for
+        a subtree, so subtrees with the same ones are counted once. The memo is
+        cleared when it reaches MEMO_SIZE entries, which keeps memory bounded.
+        """
+
+        sizes = [1 if grouped else len(nrcs) for nrcs in self.nrcs]
+        memo = {}
+
+        def count(domains: dict[int, int], missing: frozenset[str]) -> int:
+            if missing and not self.viable(domains, missing):
+                return 0
+
+            if not domains:
+                return 1
+
+            key = (tuple(domains.items()), missing)
+            n = memo.get(key, None)
+
+            if n is None:
+                n = 0
+                for k, i, remaining in self.branches(domains):
+                    professor = self.matrix.courses[i].professor
+                    n += sizes[i] * count(remaining, missing - {professor})
+
+                if len(memo) >= MEMO_SIZE:
+                    memo.clear()
+
+                memo[key] = n
+
+            return n
+
+        return count
+
+    def sample(self, k: int, rng: random.Random, grouped: bool = False) -> list[tuple]:
+        """
+        Returns `k` different schedules (or all of them, if there are fewer)
+        picked uniformly at random with `rng`, in the order they're drawn.
+        Schedules are nrcs tuples, or tuples of groups if `grouped`.
+
+        Schedules are numbered in search order (see `unrank`), and each drawn
+        number is followed down the tree using the subtree counts (see
+        `counter`), so nothing is enumerated.
+        """
+
+        _, domains, missing = self.root
+        if domains is None:
+            return []
+
+        count = self.counter(grouped)
+        total = count(domains, missing)
+
+        if 2 * k >= total:
+            indices = rng.sample(range(total), min(k, total))
+        else:
+            indices = {}
+            while len(indices) < k:
+                indices.setdefault(rng.randrange(total))
+
+        return [self.unrank(index, count, grouped) for index in indices]
+
+    def unrank(
+            self,
+            index: int,
+            count: Callable[[dict[int, int], frozenset[str]], int],
+            grouped: bool = False
+        ) -> tuple:
+        """
+        Returns the schedule number `index` in search order, using `count`
+        from `counter` (with the same `grouped`) to skip whole subtrees.
+        Unless `grouped`, each course of a group is its own branch.
+        """
+
+        chosen, domains, missing = self.root
+        chosen = list(chosen)
+
+        while domains:
+            for k, i, remaining in self.branches(domains):
+                rest = missing - {self.matrix.courses[i].professor}
+                n = count(remaining, rest)
+                size = 1 if grouped else len(self.nrcs[i])
+
+                if index < size * n:
+                    break
+
+                index -= size * n
+            else:
+                raise IndexError('schedule index out of range')
+
+            chosen[k] = self.nrcs[i] if grouped else (self.nrcs[i][index // n],)
+            index %= n
+            domains, missing = remaining, rest
+
+        schedule = self.prefix + tuple(chosen)
+        return schedule if grouped else tuple(nrcs[0] for nrcs in schedule)
+
+    def best(self, k: int, score: Score) -> list[tuple[any, tuple[str]]]:
+        """
+        Returns the `k` best schedules according to `score`, best first,
+        as (score, nrcs) tuples. Only the best `k` found so far are kept,
+        and if `score` is monotone, branches that can't beat them are skipped.
+        Schedules with the same score are kept in the order they're found.
+        """
+
+        heap = [] # worst schedule first, see `_Ranked`
+        found = itertools.count()
+        prot = self.prot.copy() if self.prot else SchedulePrototype()
+        chosen = list(self.root[0])
+
+        def search(domains: dict[int, int], missing: frozenset[str]):
+            if missing and not self.viable(domains, missing):
+                return
+
+            if len(heap) == k and score.monotone and not score(prot) < heap[0].score:
+                return
+
+            if not domains:
+                value = score(prot)
+                for nrcs in itertools.product(*self.prefix, *chosen):
+                    ranked = _Ranked(value, next(found), nrcs)
+
+                    if len(heap) < k:
+                        heapq.heappush(heap, ranked)
+                    elif heap[0] < ranked:
+                        heapq.heapreplace(heap, ranked)
+                    else:
+                        # the rest of this group is just as good, but found later
+                        break
+
+                return
+
+            for j, i, remaining in self.branches(domains):
+                course = self.matrix.courses[i]
+                chosen[j] = self.nrcs[i]
+
+                prot.add_course(course)
+                search(remaining, missing - {course.professor})
+                prot.remove_course(course)
+
+        _, domains, missing = self.root
+        if domains is not None and k > 0:
+            search(domains, missing)
+
+        return [(r.score, r.nrcs) for r in sorted(heap, reverse=True)]
+
+    def split(self, count: int) -> list[tuple]:
+        """
+        Splits the search tree into at least `count` nodes (if it's big enough),
+        going down a level at a time. Nodes are in the order the serial search
+        visits them, so their schedules can be merged back in that order.
+        """
+
+        nodes = [self.root] if self.root[1] is not None else []
+
+        while len(nodes) < count:
+            split = []
+            for node in nodes:
+                chosen, domains, missing = node
+
+                # leaves and dead ends are kept as they are
+                if not domains or not self.viable(domains, missing):
+                    split.append(node)
+                    continue
+
+                for k, i, remaining in self.branches(domains):
+                    child = list(chosen)
+                    child[k] = self.nrcs[i]
+                    split.append((
+                        tuple(child),
+                        remaining,
+                        missing - {self.matrix.courses[i].professor}
+                    ))
+
+            if len(split) == len(nodes):
+                break
+
+            nodes = split
+
+        return nodes
+
+    def parallel(self, jobs: int) -> Iterator[tuple[tuple[str]]]:
+        """
+        Same as iterating over the search, but subtrees are searched in
+        `jobs` processes. Schedules are yielded in the same order.
+
+        Only `jobs` subtrees are queued at a time, and the next one is queued
+        as each is consumed, so workers don't get far ahead of the consumer
+        and stopping early (e.g. --limit) stops the search.
+        """
+
+        nodes = iter(self.split(jobs * UNITS_PER_JOB))
+        executor = concurrent.futures.ProcessPoolExecutor(
+            jobs, initializer=_init_worker, initargs=(self,)
+        )
+        pending = collections.deque()
+
+        try:
+            for node in itertools.islice(nodes, jobs):
+                pending.append(executor.submit(_run_worker, node))
+
+            while pending:
+                schedules = pending.popleft().result()
+
+                node = next(nodes, None)
+                if node is not None:
+                    pending.append(executor.submit(_run_worker, node))
+
+                yield from schedules
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+class _Ranked:
+    """
+    Heap entry for `ScheduleSearch.best`. Ordered worst first: higher
+    score, then found later, so the heap's top is the one to drop.
+    """
+
+    __slots__ = ('score', 'order', 'nrcs')
+
+    def __init__(self, score: any, order: int, nrcs: tuple[str]):
+        self.score = score
+        self.order = order
+        self.nrcs = nrcs
+
+    def __lt__(self, other: _Ranked) -> bool:
+        return (self.score, self.order) > (other.score, other.order)
+
+# max subtree counts remembered by `ScheduleSearch.count`
+MEMO_SIZE = 1 << 20
+
+# work units per process when searching in parallel,
+# more units keep processes busy when subtrees have very different sizes
+UNITS_PER_JOB = 16
+
+_worker_search = None
+
+def _init_worker(search: ScheduleSearch):
+    global _worker_search
+    _worker_search = search
+
+def _run_worker(node: tuple) -> list[tuple[tuple[str]]]:
+    return list(_worker_search.run(node))
+
+class OptionalSearch(ScheduleSearch):
+    """
+    Search where only the first `required` names have to be in a schedule.
+    The rest are optional, each one with a weight, and schedules have to
+    have between `min_names` and `max_names` names in total.
+
+    `best` uses branch-and-bound: required names are picked first, then
+    optional ones by weight (heaviest first), each one either added or
+    skipped, and branches that can't beat the best schedules found so far
+    are dropped, so not every subset of names is searched.
+    """
+
+    def __init__(
+            self,
+            possibilities: list[list[Course]],
+            weights: list[float],
+            required: int,
+            min_names: int = None,
+            max_names: int = None,
+            professor_whitelist: list[str] = [],
+            order: SearchOrder = SearchOrder.MRV,
+        ):
+        super().__init__(possibilities, None, professor_whitelist, order)
+
+        self.weights = weights
+        self.required = required
+        self.min_names = required if min_names is None else min_names
+        self.max_names = len(possibilities) if max_names is None else max_names
+
+        # optional names without courses are never picked
+        domains = dict(enumerate(self.matrix.domains))
+        if all(domains[k] for k in range(required)):
+            domains = {k : d for k, d in domains.items() if d}
+        else:
+            domains = None
+
+        self.root = (self.root[0], domains, self.root[2])
+
+    def bound(self, domains: dict[int, int], picked: int, weight: float) -> tuple[bool, float]:
+        """
+        Returns if a node can still reach `min_names`, and the most weight
+        it could get: picking the heaviest optional names it has room for.
+        """
+
+        weights = sorted((self.weights[k] for k in domains if k >= self.required), reverse=True)
+        room = self.max_names - picked - sum(1 for k in domains if k < self.required)
+
+        return picked + len(domains) >= self.min_names, weight + sum(weights[:max(room, 0)])
+
+    def pick(self, domains: dict[int, int]) -> int:
+        required = [k for k in domains if k < self.required]
+        if required:
+            return super().pick({k : domains[k] for k in required})
+
+        return max(domains, key=lambda k: (self.weights[k], -domains[k].bit_count()))
+
+    def best(self, k: int, score: Score = None) -> list[tuple[float, tuple[str]]]:
+        """
+        Returns the `k` schedules with the most weight, heaviest first, as
+        (weight, nrcs) tuples. Nrcs are in `possibilities` order, without
+        the names that weren't picked. Same weights keep the order they're found.
+        """
+
+        heap = [] # worst schedule first, see `_Ranked`
+        found = itertools.count()
+        chosen = list(self.root[0])
+
+        def search(domains: dict[int, int], missing: frozenset[str], picked: int, weight: float):
+            if missing and not self.viable(domains, missing):
+                return
+
+            reachable, bound = self.bound(domains, picked, weight)
+            if not reachable or len(heap) == k and not -bound < heap[0].score:
+                return
+
+            if not domains:
+                for nrcs in itertools.product(*(nrcs for nrcs in chosen if nrcs is not None)):
+                    ranked = _Ranked(-weight, next(found), nrcs)
+
+                    if len(heap) < k:
+                        heapq.heappush(heap, ranked)
+                    elif heap[0] < ranked:
+                        heapq.heapreplace(heap, ranked)
+                    else:
+                        break
+
+                return
+
+            j = self.pick(domains)
+            optional = j >= self.required
+
+            if picked < self.max_names:
+                for i in iter_bits(domains[j]):
+                    compatible = self.matrix.compatible[i]
+                    remaining = {}
+                    for n, d in domains.items():
+                        if n != j:
+                            d &= compatible
+                            if d:
+                                remaining[n] = d
+                            elif n < self.required:
+                                break
+                    else:
+                        chosen[j] = self.nrcs[i]
+                        search(
+                            remaining,
+                            missing - {self.matrix.courses[i].professor},
+                            picked + 1,
+                            weight + (self.weights[j] if optional else 0)
+                        )
+
+                chosen[j] = None
+
+            if optional:
+                search({n : d for n, d in domains.items() if n != j}, missing, picked, weight)
+
+        _, domains, missing = self.root
+        if domains is not None and k > 0:
+            search(domains, missing, 0, 0)
+
+        return [(-r.score, r.nrcs) for r in sorted(heap, reverse=True)]
+
+class InstrumentedSearch(ScheduleSearch):
+    """
+    ScheduleSearch that counts what it does, for --stats. By depth (names picked):
+        - nodes: nodes branched on
+        - dead_ends: groups dropped because a remaining name ran out of groups
+        - pruned: nodes dropped because a white-listed professor can't show up
+    And in total:
+        - checks: groups checked against the remaining names
+        - leaves: complete schedules (grouped), None unless every schedule was
+          listed, since counting, sampling and ranking don't visit them all
+    Counters aren't collected from other processes (see `parallel`).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        depth = len(self.root[0]) + 1
+        self.nodes = [0] * depth
+        self.dead_ends = [0] * depth
+        self.pruned = [0] * depth
+        self.checks = 0
+        self.leaves = None
+
+    def depth(self, domains: dict[int, int]) -> int:
+        return len(self.root[0]) - len(domains)
+
+    def viable(self, domains: dict[int, int], missing: frozenset[str]) -> bool:
+        if super().viable(domains, missing):
+            return True
+
+        self.pruned[self.depth(domains)] += 1
+        return False
+
+    def branches(self, domains: dict[int, int]) -> Iterator[tuple[int, int, dict[int, int]]]:
+        depth = self.depth(domains)
+        k = self.pick(domains)
+        self.nodes[depth] += 1
+
+        # same as ScheduleSearch.branches, counting groups as they're checked
+        for i in iter_bits(domains[k]):
+            self.checks += 1
+            compatible = self.matrix.compatible[i]
+            remaining = {j : d & compatible for j, d in domains.items() if j != k}
+
+            if all(remaining.values()):
+                yield k, i, remaining
+            else:
+                self.dead_ends[depth] += 1
+
+    def run(self, node: tuple) -> Iterator[tuple[tuple[str]]]:
+        if self.leaves is None:
+            self.leaves = 0
+
+        return super().run(node)
+
+    def search(
+            self,
+            chosen: list[tuple[str]],
+            domains: dict[int, int],
+            missing: frozenset[str]
+        ) -> Iterator[tuple[tuple[str]]]:
+        if not domains and not missing:
+            self.leaves += 1
+
+        return super().search(chosen, domains, missing)
+
+class Stats:
+    """
+    Wall and CPU time of each phase of a run, for --stats.
+    If `profile` is a filename, phases marked for profiling run under
+    cProfile, and the profile is written there by `report`.
+    """
+
+    def __init__(self, profile: str = None):
+        self.times = {}
+        self.profile = profile
+        self.profiler = cProfile.Profile() if profile else None
+
+    @contextlib.contextmanager
+    def phase(self, name: str, profile: bool = False):
+        """
+        Context manager, adds the time spent inside to phase `name`.
+        """
+
+        profiler = self.profiler if profile else None
+        wall, cpu = time.perf_counter(), time.process_time()
+
+        if profiler:
+            profiler.enable()
+
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+
+            times = self.times.setdefault(name, [0.0, 0.0])
+            times[0] += time.perf_counter() - wall
+            times[1] += time.process_time() - cpu
+
+    def timed(self, iterable: Iterable, name: str, profile: bool = False) -> Iterator:
+        """
+        Yields from `iterable`, adding the time spent getting each item to phase `name`.
+        """
+
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name, profile):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+
+            yield item
+
+    def report(self, search: InstrumentedSearch = None, file=None):
+        """
+        Prints the timings, the search's counters and peak memory to `file` (stderr by default).
+        """
+
+        file = file if file is not None else sys.stderr
+
+        rows = [[name, f'{wall:.4f}s', f'{cpu:.4f}s'] for name, (wall, cpu) in self.times.items()]
+        print(tabulate.tabulate(rows, headers=['Phase', 'Wall', 'CPU']) + '\n', file=file)
+
+        if search is not None:
+            leaves = 'leaves not counted' if search.leaves is None else f'{search.leaves} leaves'
+            print(
+                f'{sum(search.nodes)} nodes, {search.checks} checks, '
+                f'{sum(search.dead_ends)} dead ends, {sum(search.pruned)} pruned, {leaves}\n',
+                file=file
+            )
+
+            rows = [
+                [depth, nodes, dead_ends, pruned]
+                for depth, (nodes, dead_ends, pruned)
+                in enumerate(zip(search.nodes, search.dead_ends, search.pruned))
+            ]
+            print(
+                tabulate.tabulate(rows, headers=['Depth', 'Nodes', 'Dead ends', 'Pruned']) + '\n',
+                file=file
+            )
+
+        if resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # kilobytes on Linux, bytes on macOS
+            peak = peak if sys.platform == 'darwin' else peak * 1024
+            print(f'Peak memory: {peak / (1 << 20):.1f} MiB', file=file)
+
+        if self.profiler:
+            self.profiler.dump_stats(self.profile)
+            print(f'Search profile written to {self.profile}', file=file)
+
+def iter_schedule_groups(
+        possibilities: list[list[Course]],
+        prot: SchedulePrototype = None,
+        professor_whitelist: list[str] = [],
+        order: SearchOrder = SearchOrder.MRV,
+        jobs: int = 1,
+    ) -> Iterator[tuple[tuple[str]]]:
+    """
+    Generator. Yields all possible schedule combinations given `possibilities`,
+    with courses with the same time blocks grouped, as soon as they're found.
+    See `ScheduleSearch`. With more than one job, the search is split
+    across processes (see `ScheduleSearch.parallel`).
+    """
+
+    search = ScheduleSearch(possibilities, prot, professor_whitelist, order)
+
+    if jobs > 1:
+        yield from search.parallel(jobs)
+    else:
+        yield from search
+
+def iter_schedules(
+        possibilities: list[list[Course]],
+        prot: SchedulePrototype = None,
+        professor_whitelist: list[str] = [],
+        order: SearchOrder = SearchOrder.MRV,
+        jobs: int = 1,
+    ) -> Iterator[tuple[str]]:
+    """
+    Generator. Yields all possible schedule combinations given `possibilities`,
+    as tuples of nrcs, as soon as they're found. Nrcs are always in
+    `possibilities` order, whatever `order` the search follows.
+
+    Searches over groups of courses with the same time blocks
+    (see `iter_schedule_groups`) and expands them when yielding.
+    """
+
+    return expand_groups(iter_schedule_groups(possibilities, prot, professor_whitelist, order, jobs))
+
+def expand_groups(schedules: Iterable[tuple[tuple[str]]]) -> Iterator[tuple[str]]:
+    """
+    Yields every combination of nrcs of each grouped schedule.
+    """
+
+    for groups in schedules:
+        yield from itertools.product(*groups)
+
+def combine_r(
+        prot: SchedulePrototype,
+        possibilities: list[list[Course]],
+        combinations: list[tuple[str]]
+    ):
+    """
+    Gets all possible schedule combinations given `possibilities`.
+    Stores them in `combinations` as tuples of nrcs.
+    See `iter_schedules`.
+    """
+
+    combinations.extend(iter_schedules(possibilities, prot))
+
+class IncrementalSearch:
+    """
+    Keeps the candidate courses and grouped schedules of the last `solve`,
+    so the next one only does the work for what changed:
+        - courses that aren't candidates anymore are dropped from the
+          previous schedules, instead of searching again
+        - only schedules with some newly admitted course are searched
+
+    The names or white-listed professors changing means searching from scratch.
+    Previous schedules keep their order, new ones come after them.
+    """
+
+    def __init__(self, order: SearchOrder = SearchOrder.MRV):
+        self.order = order
+        self.names = None
+        self.professor_whitelist = None
+        self.candidates = None # nrcs of each name's courses
+        self.group_keys = {} # (time signature, professor) -> number
+        self.schedules = None # group keys -> grouped schedule
+        self.mode = None # how the last `solve` went: full, filtered or incremental
+
+    def group_key(self, course: Course) -> int:
+        """
+        Returns a number for what courses grouped with `course` share, see `group_by_time`.
+        """
+
+        prof = course.professor if course.professor in self.professor_whitelist else None
+        return self.group_keys.setdefault((course.time_signature(), prof), len(self.group_keys))
+
+    def solve(
+            self,
+            names: list[str],
+            possibilities: list[list[Course]],
+            professor_whitelist: list[str] = []
+        ) -> list[tuple[tuple[str]]]:
+        """
+        Returns every grouped schedule for `possibilities`, the courses of each of `names`.
+        """
+
+        candidates = [{c.nrc for c in courses} for courses in possibilities]
+
+        if (self.schedules is None or names != self.names or
+            set(professor_whitelist) != self.professor_whitelist):
+            self.names = names
+            self.professor_whitelist = set(professor_whitelist)
+            self.group_keys = {}
+            self.schedules = {}
+            self.add(possibilities, possibilities)
+            self.mode = 'full'
+        else:
+            self.filter(candidates)
+            added = [
+                [c for c in courses if c.nrc not in old]
+                for courses, old in zip(possibilities, self.candidates)
+            ]
+            self.add(possibilities, added)
+            self.mode = 'incremental' if any(added) else 'filtered'
+
+        self.candidates = candidates
+        return list(self.schedules.values())
+
+    def filter(self, candidates: list[set[str]]):
+        """
+        Drops the courses that aren't in `candidates` anymore from the
+        schedules, and the schedules left without courses for some name.
+        """
+
+        removed = [old - nrcs for nrcs, old in zip(candidates, self.candidates)]
+        changed = [j for j, nrcs in enumerate(removed) if nrcs]
+        if not changed:
+            return
+
+        # groups are shared by many schedules, so each one is filtered once
+        filtered = {}
+        schedules = {}
+        for key, schedule in self.schedules.items():
+            groups = list(schedule)
+            for j in changed:
+                group = filtered.get(id(schedule[j]), None)
+                if group is None:
+                    group = tuple(nrc for nrc in schedule[j] if nrc not in removed[j])
+                    filtered[id(schedule[j])] = group
+
+                if not group:
+                    break
+
+                groups[j] = group
+            else:
+                schedules[key] = tuple(groups)
+
+        self.schedules = schedules
+
+    def add(self, possibilities: list[list[Course]], added: list[list[Course]]):
+        """
+        Searches the schedules with at least one course from `added`. The k-th
+        search has an added course for the k-th name, and only courses that
+        were already candidates for the names before it, so none is repeated.
+        """
+
+        keys = {c.nrc : self.group_key(c) for courses in possibilities for c in courses}
+
+        # every course of a name with the same group key is interchangeable
+        groups = []
+        for courses in possibilities:
+            by_key = {}
+            for c in courses:
+                by_key.setdefault(keys[c.nrc], []).append(c.nrc)
+
+            groups.append({key : tuple(nrcs) for key, nrcs in by_key.items()})
+
+        for k, new in enumerate(added):
+            if not new:
+                continue
+
+            subset = [
+                [c for c in courses if c.nrc not in nrcs]
+                for courses, nrcs in zip(possibilities[:k], ({c.nrc for c in a} for a in added))
+            ]
+            subset += [new] + possibilities[k + 1:]
+
+            for schedule in ScheduleSearch(subset, None, list(self.professor_whitelist), self.order):
+                key = tuple(keys[group[0]] for group in schedule)
+
+                # with every course of its groups, some may be from other searches
+                self.schedules[key] = tuple(by_key[g] for by_key, g in zip(groups, key))
+
+# seconds between checks for config changes, see `watch`
+WATCH_INTERVAL = 0.5
+
+def watch(
+        config_file: str,
+        courses_by_nrc: dict[str, Course],
+        show: Callable[[list[tuple[tuple[str]]], IncrementalSearch], None],
+        order: SearchOrder = SearchOrder.MRV,
+    ):
+    """
+    Solves `config_file` every time it changes, with an IncrementalSearch,
+    and calls `show` with the grouped schedules. Runs until interrupted.
+    """
+
+    search = IncrementalSearch(order)
+    mtime = None
+
+    while True:
+        try:
+            current = os.stat(config_file).st_mtime_ns
+        except OSError:
+            current = None
+
+        if current != mtime:
+            mtime = current
+
+            try:
+                with open(config_file, 'r') as f:
+                    config = json.load(f)
+
+                possibilities, professor_whitelist = config_courses(courses_by_nrc, config)
+                names = list(dict.fromkeys(config[CONFIG_KEYS[ConfigKey.CLASS_NAMES]]))
+            except (OSError, ValueError) as e:
+                print(f'Can\'t read `{config_file}`: {e}', file=sys.stderr)
+            except KeyError as e:
+                print(f'Key "{e.args[0]}" not found in `{config_file}`.', file=sys.stderr)
+            except (AssertionError, AttributeError, TypeError):
+                print(f'Invalid `{config_file}`, e.g. a time that isn\'t "hhmm-hhmm".', file=sys.stderr)
+            else:
+                show(search.solve(names, possibilities, professor_whitelist), search)
+
+        time.sleep(WATCH_INTERVAL)
+
+def config_courses(
+        courses_by_nrc: dict[str, Course],
+        config: dict
+    ) -> tuple[list[list[Course]], list[str]]:
+    """
+    Returns the courses of each name and the white-listed professors for `config`,
+    which has the same keys as schedule-config.json. Raises KeyError if one is missing.
+    """
+
+    courses_by_name = collect_courses(
+        courses_by_nrc,
+        config[CONFIG_KEYS[ConfigKey.CLASS_NAMES]],
+        professor_blacklist=config[CONFIG_KEYS[ConfigKey.PROFESSOR_BLACKLIST]],
+        course_blacklist=config[CONFIG_KEYS[ConfigKey.COURSE_BLACKLIST]],
+        time_restrictions=config[CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS]],
+        course_whitelist=config[CONFIG_KEYS[ConfigKey.COURSE_WHITELIST]]
+    )
+
+    return list(courses_by_name.values()), config[CONFIG_KEYS[ConfigKey.PROFESSOR_WHITELIST]]
+
+def optional_search(
+        courses_by_nrc: dict[str, Course],
+        config: dict,
+        order: SearchOrder = SearchOrder.MRV
+    ) -> OptionalSearch:
+    """
+    Returns the OptionalSearch for `config`: its "materias" are required, and
+    "materias-opcionales" are optional, either a list or a dict of name -> weight
+    (1 by default), unless they have a course in "con-cursos". "total-materias"
+    is how many names schedules have, a number or a [min, max] list, every one
+    that fits by default.
+    Raises KeyError if a key is missing, and ValueError if "total-materias" is invalid.
+    """
+
+    optional = config[CONFIG_KEYS[ConfigKey.OPTIONAL_NAMES]]
+    if isinstance(optional, list):
+        optional = dict.fromkeys(optional, 1)
+
+    # names of wanted courses can't be skipped
+    required = list(dict.fromkeys(config[CONFIG_KEYS[ConfigKey.CLASS_NAMES]]))
+    required += [
+        name for name in optional
+        if name not in required and any(
+            courses_by_nrc[nrc].name == name
+            for nrc in config[CONFIG_KEYS[ConfigKey.COURSE_WHITELIST]] if nrc in courses_by_nrc
+        )
+    ]
+    optional = {name : weight for name, weight in optional.items() if name not in required}
+    names = required + list(optional)
+
+    count = config.get(CONFIG_KEYS[ConfigKey.NAME_COUNT], None)
+    if count is None:
+        min_names, max_names = None, None
+    elif isinstance(count, int):
+        min_names, max_names = count, count
+    elif isinstance(count, list) and len(count) == 2 and all(isinstance(n, int) for n in count):
+        min_names, max_names = count
+    else:
+        raise ValueError(f'{CONFIG_KEYS[ConfigKey.NAME_COUNT]} must be a number or a [min, max] list')
+
+    courses_by_name = collect_courses(
+        courses_by_nrc,
+        names,
+        professor_blacklist=config[CONFIG_KEYS[ConfigKey.PROFESSOR_BLACKLIST]],
+        course_blacklist=config[CONFIG_KEYS[ConfigKey.COURSE_BLACKLIST]],
+        time_restrictions=config[CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS]],
+        course_whitelist=config[CONFIG_KEYS[ConfigKey.COURSE_WHITELIST]]
+    )
+
+    return OptionalSearch(
+        [courses_by_name[name] for name in names],
+        [0] * len(required) + list(optional.values()),
+        len(required),
+        min_names,
+        max_names,
+        professor_whitelist=config[CONFIG_KEYS[ConfigKey.PROFESSOR_WHITELIST]],
+        order=order
+    )
+
+def parse_rank(rank: str) -> Score:
+    """
+    Returns the combined score of comma separated SCORES names, e.g. "days,gaps".
+    Raises KeyError with the first unknown name.
+    """
+
+    return Score.combine([SCORES[name.strip()] for name in rank.split(',')])
+
+def normalize_name(name: str) -> str:
+    """
+    Returns `name` without leading, trailing or repeated whitespace.
+    """
+
+    return ' '.join(name.split())
+
+def normalize_config(config: dict, spellings: dict[str, str] = {}) -> dict:
+    """
+    Returns `config` in a canonical form, so configs that ask for the same thing are equal:
+        - names and professors without extra whitespace, spelled as in
+          `spellings` (normalized -> catalog spelling) when they're there
+        - nrcs as strings
+        - lists sorted, without repeats
+        - time restrictions merged into sorted ranges that don't overlap
+    Raises KeyError if a key is missing, and AssertionError on invalid time ranges.
+    """
+
+    def names(key: ConfigKey) -> list[str]:
+        return sorted({spell(name, spellings) for name in config[CONFIG_KEYS[key]]})
+
+    def nrcs(key: ConfigKey) -> list[str]:
+        return sorted({str(nrc).strip() for nrc in config[CONFIG_KEYS[key]]})
+
+    time_restrictions = {}
+    for day, ranges in sorted(config[CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS]].items()):
+        merged = merge_ranges(ranges)
+        if merged:
+            time_restrictions[day] = [f'{start:04}-{end:04}' for start, end in merged]
+
+    return {
+        CONFIG_KEYS[ConfigKey.CLASS_NAMES] : names(ConfigKey.CLASS_NAMES),
+        CONFIG_KEYS[ConfigKey.PROFESSOR_BLACKLIST] : names(ConfigKey.PROFESSOR_BLACKLIST),
+        CONFIG_KEYS[ConfigKey.PROFESSOR_WHITELIST] : names(ConfigKey.PROFESSOR_WHITELIST),
+        CONFIG_KEYS[ConfigKey.COURSE_BLACKLIST] : nrcs(ConfigKey.COURSE_BLACKLIST),
+        CONFIG_KEYS[ConfigKey.COURSE_WHITELIST] : nrcs(ConfigKey.COURSE_WHITELIST),
+        CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS] : time_restrictions,
+    }
+
+def spell(name: str, spellings: dict[str, str]) -> str:
+    name = normalize_name(name)
+    return spellings.get(name, name)
+
+def catalog_hash(courses_by_nrc: dict[str, Course]) -> str:
+    """
+    Returns a hash of every course's data, to tell catalogs apart.
+    """
+
+    digest = hashlib.sha256()
+    for nrc in sorted(courses_by_nrc):
+        course = courses_by_nrc[nrc]
+        blocks = sorted((day, b.time, b.room) for day, bs in course.schedule.items() for b in bs)
+        digest.update(repr((nrc, course.name, course.professor, blocks)).encode())
+
+    return digest.hexdigest()
+
+def result_size(schedules: list[tuple[tuple[str]]]) -> int:
+    """
+    Returns about how many bytes `schedules` take. Nrcs aren't counted,
+    they're interned and shared with the catalog.
+    """
+
+    return sys.getsizeof(schedules) + sum(
+        sys.getsizeof(s) + sum(sys.getsizeof(g) for g in s) for s in schedules
+    )
+
+class ResultCache:
+    """
+    LRU cache of query results. Keeps up to `max_entries` results and
+    `max_bytes` (as told to `put`), dropping the least recently used first.
+
+    If `directory` is given, results are also pickled there, up to
+    `max_files` of them, and loaded back when they aren't in memory.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            max_bytes: int = 256 << 20,
+            directory: str = None,
+            max_files: int = 4096
+        ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_files = max_files
+        self.entries = collections.OrderedDict() # key -> (result, size)
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> any:
+        """
+        Returns the result for `key`, or None if there's none.
+        """
+
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self.directory is not None:
+            try:
+                with open(self.file(key), 'rb') as f:
+                    cached_key, result, size = pickle.load(f)
+            except Exception:
+                cached_key = None
+
+            if cached_key == key:
+                self.store(key, result, size)
+                self.hits += 1
+                self.disk_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, result: any, size: int):
+        """
+        Stores `result`, which takes about `size` bytes. Results bigger than
+        `max_bytes` aren't stored.
+        """
+
+        if size > self.max_bytes:
+            return
+
+        self.store(key, result, size)
+
+        if self.directory is not None:
+            self.save(key, result, size)
+
+    def store(self, key: tuple, result: any, size: int):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+
+        self.entries[key] = (result, size)
+        self.bytes += size
+
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def file(self, key: tuple) -> str:
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest())
+
+    def save(self, key: tuple, result: any, size: int):
+        """
+        Pickles a result, like `save_cache`. Failing to do so isn't an error.
+        """
+
+        cache_file = self.file(key)
+        tmp = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump((key, result, size), f, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmp, cache_file)
+
+            files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+            if len(files) > self.max_files:
+                files.sort(key=os.path.getmtime)
+                for old in files[:len(files) - self.max_files]:
+                    os.remove(old)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            'hits' : self.hits,
+            'disk_hits' : self.disk_hits,
+            'misses' : self.misses,
+            'evictions' : self.evictions,
+            'entries' : len(self.entries),
+            'bytes' : self.bytes,
+        }
+
+# searches each server worker keeps, so the units of a query don't rebuild it
+SERVER_SEARCHES = 8
+
+_worker_courses = None
+_server_searches = {}
+
+def _init_catalog_worker(courses_by_nrc: dict[str, Course]):
+    global _worker_courses
+    _worker_courses = courses_by_nrc
+
+def _server_search(query: tuple[str, str]) -> ScheduleSearch:
+    """
+    Returns the search for `query`, a tuple (config as JSON, order name).
+    """
+
+    search = _server_searches.get(query, None)
+    if search is None:
+        config, order = query
+        possibilities, professor_whitelist = config_courses(_worker_courses, json.loads(config))
+        search = ScheduleSearch(
+            possibilities,
+            professor_whitelist=professor_whitelist,
+            order=SEARCH_ORDERS[order]
+        )
+
+        if len(_server_searches) >= SERVER_SEARCHES:
+            del _server_searches[next(iter(_server_searches))]
+
+        _server_searches[query] = search
+
+    return search
+
+def _server_render(
+        schedules: Iterable[tuple[tuple[str]]],
+        format: str,
+        grouped: bool,
+        order: list[int],
+        limit: int | None
+    ) -> list[str]:
+    """
+    Renders up to `limit` grouped schedules (every combination of them,
+    unless `grouped`), with their names in `order` (indexes into each schedule).
+    """
+
+    if format == 'text':
+        writer = ScheduleWriter(_worker_courses)
+    else:
+        writer = JsonLinesWriter()
+
+    schedules = (tuple(schedule[i] for i in order) for schedule in schedules)
+    if not grouped:
+        schedules = expand_groups(schedules)
+
+    rendered = []
+    for schedule in itertools.islice(schedules, limit):
+        if grouped:
+            prot = SchedulePrototype.from_nrcs([g[0] for g in schedule], _worker_courses)
+            rendered.append(writer.render(prot, groups=schedule))
+        else:
+            rendered.append(writer.render(SchedulePrototype.from_nrcs(schedule, _worker_courses)))
+
+    return rendered
+
+def _server_split(query: tuple[str, str], count: int) -> list[tuple]:
+    return _server_search(query).split(count)
+
+def _server_run(
+        query: tuple[str, str],
+        node: tuple,
+        format: str,
+        grouped: bool,
+        order: list[int],
+        limit: int | None
+    ) -> tuple[list[tuple[tuple[str]]], list[str], bool]:
+    """
+    Searches `node`. Returns its grouped schedules, up to `limit` of them rendered,
+    and whether they're all there: the search stops once `limit` are found.
+    """
+
+    schedules = []
+    found = 0
+    for schedule in _server_search(query).run(node):
+        schedules.append(schedule)
+        found += 1 if grouped else math.prod(map(len, schedule))
+
+        if limit is not None and found >= limit:
+            return schedules, _server_render(schedules, format, grouped, order, limit), False
+
+    return schedules, _server_render(schedules, format, grouped, order, limit), True
+
+def _server_replay(
+        schedules: list[tuple[tuple[str]]],
+        format: str,
+        grouped: bool,
+        order: list[int],
+        limit: int | None
+    ) -> tuple[list, list[str], bool]:
+    """
+    Same as `_server_run`, for schedules that were already found.
+    """
+
+    return schedules, _server_render(schedules, format, grouped, order, limit), True
+
+def _server_count(query: tuple[str, str], grouped: bool) -> int:
+    return _server_search(query).count(grouped=grouped)
+
+def _server_best(query: tuple[str, str], rank: str, top: int) -> list[tuple[tuple[str]]]:
+    return [tuple((nrc,) for nrc in nrcs) for _, nrcs in _server_search(query).best(top, parse_rank(rank))]
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+HTTP_REASONS = {
+    200 : 'OK',
+    400 : 'Bad Request',
+    404 : 'Not Found',
+    405 : 'Method Not Allowed',
+    500 : 'Internal Server Error',
+}
+
+# grouped schedules rendered by each worker when replaying a cached result
+REPLAY_CHUNK = 256
+
+class ScheduleServer:
+    """
+    Answers schedule queries over HTTP, with the catalog parsed only once.
+    Queries are searched in a pool of `jobs` processes. Each query is split
+    in units (see `ScheduleSearch.split`) and only `jobs` units of it are
+    queued at a time, so a big query doesn't keep small ones waiting.
+
+    Configs are normalized (see `normalize_config`) and results are kept in
+    `cache` (a ResultCache), so configs that ask for the same thing are only
+    searched once. Names are searched in sorted order, so a query always
+    gets its schedules in the same order, and shown in the config's order.
+
+    Every POST has a config as body, same as schedule-config.json:
+        - POST /schedules: streams the schedules. Query parameters: format
+          (jsonl or text), limit, grouped, order, rank and top (same as the
+          CLI's options)
+        - POST /count: how many schedules there are. Parameters: grouped, order
+        - GET /stats: the cache's metrics, as JSON
+    """
+
+    def __init__(self, courses_by_nrc: dict[str, Course], jobs: int = 1, cache: ResultCache = None):
+        self.courses_by_nrc = courses_by_nrc
+        self.jobs = jobs
+        self.cache = cache if cache is not None else ResultCache()
+        self.catalog = catalog_hash(courses_by_nrc)
+        self.spellings = {}
+        for course in courses_by_nrc.values():
+            for name in (course.name, course.professor):
+                self.spellings[normalize_name(name)] = name
+
+        # forked workers would keep a copy of the connections open at the time
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=context, initializer=_init_catalog_worker, initargs=(courses_by_nrc,)
+        )
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000, path: str = None):
+        """
+        Listens on `host`:`port`, or on the Unix socket `path` if given, until cancelled.
+        """
+
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answers a single request, then closes the connection.
+        """
+
+        try:
+            try:
+                method, path, params, body = await read_request(reader)
+                await self.respond(writer, method, path, params, body)
+            except HTTPError as e:
+                await write_response(writer, e.status, f'{e}\n')
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception as e:
+                await write_response(writer, 500, f'{type(e).__name__}: {e}\n')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(
+            self,
+            writer: asyncio.StreamWriter,
+            method: str,
+            path: str,
+            params: dict[str, str],
+            body: bytes
+        ):
+        if path == '/stats':
+            if method != 'GET':
+                raise HTTPError(405, 'Only GET is allowed')
+
+            await write_response(writer, 200, json.dumps(self.cache.metrics()) + '\n')
+            return
+
+        if path not in ('/schedules', '/count'):
+            raise HTTPError(404, f'Unknown path "{path}"')
+
+        if method != 'POST':
+            raise HTTPError(405, 'Only POST is allowed')
+
+        try:
+            config = json.loads(body)
+        except ValueError as e:
+            raise HTTPError(400, f'Invalid config: {e}')
+
+        if not isinstance(config, dict):
+            raise HTTPError(400, 'Invalid config: not an object')
+
+        try:
+            normalized = normalize_config(config, self.spellings)
+        except KeyError as e:
+            raise HTTPError(400, f'Key "{e.args[0]}" not found in config')
+        except (AssertionError, AttributeError, TypeError, ValueError):
+            raise HTTPError(400, 'Invalid config')
+
+        order = params.get('order', 'mrv')
+        if order not in SEARCH_ORDERS:
+            raise HTTPError(400, f'Unknown order "{order}"')
+
+        query = (json.dumps(normalized, sort_keys=True), order)
+        grouped = params.get('grouped', '0') not in ('', '0', 'false')
+        loop = asyncio.get_running_loop()
+
+        if path == '/count':
+            key = (self.catalog, *query, 'count', grouped)
+            count = self.cache.get(key)
+            if count is None:
+                count = await loop.run_in_executor(self.executor, _server_count, query, grouped)
+                self.cache.put(key, count, sys.getsizeof(count))
+
+            await write_response(writer, 200, f'{count}\n')
+            return
+
+        format = params.get('format', 'jsonl')
+        if format not in ('jsonl', 'text'):
+            raise HTTPError(400, f'Unknown format "{format}"')
+
+        limit = int_param(params, 'limit')
+
+        # names in the config's order (without repeats), as indexes into the sorted ones
+        names = normalized[CONFIG_KEYS[ConfigKey.CLASS_NAMES]]
+        requested = config[CONFIG_KEYS[ConfigKey.CLASS_NAMES]]
+        name_order = [names.index(name) for name in dict.fromkeys(spell(n, self.spellings) for n in requested)]
+        options = (format, grouped, name_order)
+
+        if params.get('rank'):
+            try:
+                rank = ','.join(name.strip() for name in params['rank'].split(','))
+                parse_rank(rank)
+            except KeyError as e:
+                raise HTTPError(400, f'Unknown score "{e.args[0]}"')
+
+            top = int_param(params, 'top', 10)
+            key = (self.catalog, *query, 'rank', rank, top)
+            best = self.cache.get(key)
+            if best is None:
+                best = await loop.run_in_executor(self.executor, _server_best, query, rank, top)
+                self.cache.put(key, best, result_size(best))
+
+            # ranked schedules aren't grouped
+            units = [(_server_replay, best, format, False, name_order)]
+            await self.stream(writer, format, iter(units), limit)
+            return
+
+        key = (self.catalog, *query, 'schedules')
+        schedules = self.cache.get(key)
+        if schedules is not None:
+            units = (
+                (_server_replay, schedules[i:i + REPLAY_CHUNK], *options)
+                for i in range(0, len(schedules), REPLAY_CHUNK)
+            )
+            await self.stream(writer, format, units, limit)
+            return
+
+        nodes = await loop.run_in_executor(
+            self.executor, _server_split, query, self.jobs * UNITS_PER_JOB
+        )
+        units = ((_server_run, query, node, *options) for node in nodes)
+        schedules = await self.stream(writer, format, units, limit, self.cache.max_bytes)
+
+        if schedules is not None:
+            self.cache.put(key, schedules, result_size(schedules))
+
+    async def stream(
+            self,
+            writer: asyncio.StreamWriter,
+            format: str,
+            units: Iterator[tuple],
+            limit: int | None,
+            max_bytes: int = 0
+        ) -> list[tuple[tuple[str]]] | None:
+        """
+        Runs `units`, tuples of a function like `_server_run` and its arguments
+        but the limit, in the pool and sends what they render in order.
+
+        Returns their schedules if every unit is complete and they take
+        up to `max_bytes`, None otherwise.
+        """
+
+        loop = asyncio.get_running_loop()
+        pending = collections.deque()
+        schedules = []
+        size = 0
+        started = False
+
+        try:
+            while limit is None or limit > 0:
+                while len(pending) < self.jobs:
+                    unit = next(units, None)
+                    if unit is None:
+                        break
+
+                    pending.append(loop.run_in_executor(self.executor, *unit, limit))
+
+                if not pending:
+                    break
+
+                found, rendered, complete = await pending.popleft()
+
+                if schedules is not None:
+                    size += result_size(found)
+                    if complete and size <= max_bytes:
+                        schedules.extend(found)
+                    else:
+                        schedules = None
+
+                if limit is not None:
+                    rendered = rendered[:limit]
+                    limit -= len(rendered)
+
+                if not started:
+                    write_head(writer, 200, format)
+                    started = True
+
+                if rendered:
+                    await write_chunk(writer, ''.join(rendered).encode())
+        finally:
+            for future in pending:
+                future.cancel()
+
+        if not started:
+            write_head(writer, 200, format)
+
+        await write_chunk(writer, b'')
+
+        # stopped early because of the limit
+        if pending or next(units, None) is not None:
+            return None
+
+        return schedules
+
+def int_param(params: dict[str, str], name: str, default: int = None) -> int | None:
+    value = params.get(name, None)
+    if value is None:
+        return default
+
+    try:
+        value = int(value)
+    except ValueError:
+        value = -1
+
+    if value < 0:
+        raise HTTPError(400, f'{name} must be a non-negative number')
+
+    return value
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict[str, str], bytes]:
+    """
+    Reads an HTTP request. Returns (method, path, query parameters, body).
+    """
+
+    try:
+        method, target, _ = (await reader.readline()).decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'Invalid request line')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, 'Invalid Content-Length')
+
+    body = await reader.readexactly(length)
+    url = urllib.parse.urlsplit(target)
+
+    return method, url.path, dict(urllib.parse.parse_qsl(url.query)), body
+
+def write_head(writer: asyncio.StreamWriter, status: int, format: str = None, length: int = None):
+    """
+    Writes the status line and headers. Without `length` the body is chunked.
+    """
+
+    content_type = 'application/x-ndjson' if format == 'jsonl' else 'text/plain'
+    size = f'Content-Length: {length}' if length is not None else 'Transfer-Encoding: chunked'
+
+    writer.write((
+        f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n'
+        f'Content-Type: {content_type}; charset=utf-8\r\n'
+        f'{size}\r\n'
+        'Connection: close\r\n\r\n'
+    ).encode())
+
+async def write_chunk(writer: asyncio.StreamWriter, data: bytes):
+    """
+    Writes a chunk of a chunked body, an empty one ends it.
+    """
+
+    writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+    await writer.drain()
+
+async def write_response(writer: asyncio.StreamWriter, status: int, text: str, format: str = None):
+    body = text.encode()
+    write_head(writer, status, format, len(body))
+    writer.write(body)
+    await writer.drain()
+
+def serve(argv: list[str]):
+    """
+    `schedule.py serve`: parses the data file and answers queries until interrupted.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='schedule.py serve',
+        description='Answer schedule queries over HTTP, see ScheduleServer.'
+    )
+    parser.add_argument('data')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8000)
+    parser.add_argument('--socket', metavar='PATH', help='listen on a Unix socket instead')
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='number of processes to search with'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=f'always parse the data file, instead of using the cache in {CACHE_DIR}'
+    )
+    parser.add_argument(
+        '--cache-entries',
+        type=int,
+        default=1024,
+        help='most query results to keep in memory'
+    )
+    parser.add_argument(
+        '--cache-memory',
+        type=int,
+        default=256,
+        metavar='MIB',
+        help='most memory for query results, in MiB'
+    )
+    parser.add_argument('--cache-dir', help='also keep query results in this directory')
+    args = parser.parse_args(argv)
+
+    if not args.data.endswith(DATA_EXTENSIONS):
+        parser.error('schedule data file must be .xls/.xlsx/.csv/.tsv')
+
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    if args.cache_entries < 0 or args.cache_memory < 0:
+        parser.error('--cache-entries and --cache-memory must be non-negative numbers')
+
+    cache = ResultCache(args.cache_entries, args.cache_memory << 20, args.cache_dir)
+    server = ScheduleServer(
+        parse_file(args.data, None if args.no_cache else CACHE_DIR), args.jobs, cache
+    )
+    where = args.socket if args.socket else f'http://{args.host}:{args.port}'
+    print(f'Serving {args.data} on {where}', file=sys.stderr)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def write_schedules(
+        writer: ScheduleWriter | JsonLinesWriter,
+        schedules: Iterable[tuple[tuple[str]]],
+        courses_by_nrc: dict[str, Course],
+        grouped: bool = False,
+        limit: int = None
+    ) -> int:
+    """
+    Writes up to `limit` grouped `schedules` (every combination of them,
+    unless `grouped`) with `writer`, and flushes it. Returns how many were written.
+    """
+
+    if not grouped:
+        schedules = expand_groups(schedules)
+
+    written = 0
+    for schedule in itertools.islice(schedules, limit):
+        if grouped:
+            prot = SchedulePrototype.from_nrcs([g[0] for g in schedule], courses_by_nrc)
+            writer.write(prot, groups=schedule)
+        else:
+            writer.write(SchedulePrototype.from_nrcs(schedule, courses_by_nrc))
+
+        written += 1
+
+    writer.flush()
+    return written
+
+def iter_configs(path: str) -> Iterator[tuple[str, dict | None, str | None]]:
+    """
+    Yields (name, config, error) for every config in `path`: the .json files
+    of a directory, named after the file, or the lines of a JSON Lines file,
+    named after it and the line number. Configs that can't be read have an error.
+    """
+
+    if os.path.isdir(path):
+        sources = [
+            (os.path.splitext(name)[0], os.path.join(path, name))
+            for name in sorted(os.listdir(path)) if name.endswith('.json')
+        ]
+
+        for name, filename in sources:
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    yield name, json.load(f), None
+            except (OSError, ValueError) as e:
+                yield name, None, str(e)
+    else:
+        stem = os.path.splitext(os.path.basename(path))[0]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    yield f'{stem}-{n}', json.loads(line), None
+                except ValueError as e:
+                    yield f'{stem}-{n}', None, str(e)
+
+def _batch_run(
+        config: dict,
+        filename: str,
+        format: str,
+        grouped: bool,
+        order: str,
+        limit: int | None
+    ) -> tuple[int | None, float, str | None]:
+    """
+    Writes the schedules of `config` to `filename`.
+    Returns (schedules written, seconds, error).
+    """
+
+    start = time.perf_counter()
+
+    try:
+        possibilities, professor_whitelist = config_courses(_worker_courses, config)
+        search = ScheduleSearch(
+            possibilities,
+            professor_whitelist=professor_whitelist,
+            order=SEARCH_ORDERS[order]
+        )
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            if format == 'jsonl':
+                writer = JsonLinesWriter(f)
+            else:
+                writer = ScheduleWriter(_worker_courses, f)
+
+            written = write_schedules(writer, search, _worker_courses, grouped, limit)
+    except KeyError as e:
+        return None, time.perf_counter() - start, f'Key "{e.args[0]}" not found'
+    except Exception as e:
+        return None, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+    return written, time.perf_counter() - start, None
+
+def batch(argv: list[str]):
+    """
+    `schedule.py batch`: solves many configs with the data file parsed once,
+    writing the schedules of each one to its own file.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='schedule.py batch',
+        description='Solve every config in a directory (.json files) or a JSON Lines file.'
+    )
+    parser.add_argument('data')
+    parser.add_argument('configs', help='directory of .json configs, or a JSON Lines file')
+    parser.add_argument('-o', '--output', default='schedules', help='directory for the results')
+    parser.add_argument('-l', '--limit', type=int, help='write at most LIMIT schedules per config')
+    parser.add_argument(
+        '--order',
+        choices=SEARCH_ORDERS.keys(),
+        default='mrv',
+        help='order in which the search picks course names'
+    )
+    parser.add_argument(
+        '-g', '--grouped',
+        action='store_true',
+        help='write courses with the same time blocks as a single schedule'
+    )
+    parser.add_argument('-f', '--format', choices=('text', 'jsonl'), default='text')
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='number of configs solved at the same time'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=f'always parse the data file, instead of using the cache in {CACHE_DIR}'
+    )
+    args = parser.parse_args(argv)
+
+    if not args.data.endswith(DATA_EXTENSIONS):
+        parser.error('schedule data file must be .xls/.xlsx/.csv/.tsv')
+
+    if args.limit is not None and args.limit < 0:
+        parser.error('--limit must be a non-negative number')
+
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    start = time.perf_counter()
+    courses_by_nrc = parse_file(args.data, None if args.no_cache else CACHE_DIR)
+    os.makedirs(args.output, exist_ok=True)
+    extension = '.jsonl' if args.format == 'jsonl' else '.txt'
+
+    report = {} # name -> (schedules, seconds, error)
+    futures = {}
+    with concurrent.futures.ProcessPoolExecutor(
+        args.jobs, initializer=_init_catalog_worker, initargs=(courses_by_nrc,)
+    ) as executor:
+        for name, config, error in iter_configs(args.configs):
+            if error is not None:
+                report[name] = (None, 0.0, error)
+                continue
+
+            filename = os.path.join(args.output, name + extension)
+            future = executor.submit(
+                _batch_run, config, filename, args.format, args.grouped, args.order, args.limit
+            )
+            futures[future] = name
+            report[name] = None
+
+        for future in concurrent.futures.as_completed(futures):
+            report[futures[future]] = future.result()
+
+    rows = [
+        [name, '' if written is None else written, f'{seconds:.3f}s', error or '']
+        for name, (written, seconds, error) in report.items()
+    ]
+    failed = sum(1 for _, _, error in report.values() if error is not None)
+
+    print(format_table(rows, ['Config', 'Schedules', 'Time', 'Error']), file=sys.stderr)
+    print(
+        f'\n{len(report)} configs, {failed} failed, {time.perf_counter() - start:.3f}s',
+        file=sys.stderr
+    )
+
+    with open(os.path.join(args.output, 'report.json'), 'w') as f:
+        json.dump({
+            name : {'schedules' : written, 'seconds' : seconds, 'error' : error}
+            for name, (written, seconds, error) in report.items()
+        }, f, indent=4)
+
+    if failed:
+        exit(1)
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2:])
+        exit(0)
+
+    if sys.argv[1:2] == ['batch']:
+        batch(sys.argv[2:])
+        exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data')
+    parser.add_argument('-c', '--config')
+    parser.add_argument('-l', '--limit', type=int, help='show at most LIMIT schedules')
+    parser.add_argument(
+        '--order',
+        choices=SEARCH_ORDERS.keys(),
+        default='mrv',
+        help='order in which the search picks course names'
+    )
+    parser.add_argument(
+        '-g', '--grouped',
+        action='store_true',
+        help='show courses with the same time blocks as a single schedule'
+    )
+    parser.add_argument(
+        '--count',
+        action='store_true',
+        help='only show how many schedules there are'
+    )
+    parser.add_argument(
+        '--rank',
+        help='show the best schedules by these comma separated scores, '
+            f'lower is better: {", ".join(SCORES.keys())}'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=10,
+        help='how many schedules to show with --rank, or with optional names (materias-opcionales)'
+    )
+    parser.add_argument(
+        '--sample',
+        type=int,
+        metavar='N',
+        help='show N different schedules picked uniformly at random'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='random seed for --sample, the same seed picks the same schedules'
+    )
+    parser.add_argument(
+        '-f', '--format',
+        choices=OUTPUT_FORMATS,
+        default='text',
+        help='text tables, JSON lines, or binary records (see BinaryWriter)'
+    )
+    parser.add_argument(
+        '-z', '--gzip',
+        action='store_true',
+        help='compress the output with gzip'
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='show timings, search counters and peak memory on stderr'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='FILE',
+        help='run the search under cProfile and write the profile to FILE (implies --stats)'
+    )
+    parser.add_argument(
+        '--sections',
+        action='store_true',
+        help='only list the courses of any name that fit sin-horarios, sin-profesores and sin-cursos'
+    )
+    parser.add_argument(
+        '-w', '--watch',
+        action='store_true',
+        help='solve again, incrementally, every time the config file changes'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=f'always parse the data file, instead of using the cache in {CACHE_DIR}'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='number of processes to search with'
+    )
+    args = parser.parse_args()
+
+    if not args.data.endswith(DATA_EXTENSIONS):
+        print('Schedule data file must be .xls/.xlsx/.csv/.tsv termina.')
+        exit(1)
+
+    if args.limit is not None and args.limit < 0:
+        parser.error('--limit must be a non-negative number')
+
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    if args.top < 0:
+        parser.error('--top must be a non-negative number')
+
+    if args.sample is not None and args.sample < 0:
+        parser.error('--sample must be a non-negative number')
+
+    if args.sample is not None and (args.count or args.rank or args.watch or args.jobs > 1):
+        parser.error('--sample can\'t be used with --count, --rank, --watch or --jobs')
+
+    if args.format == 'binary' and args.grouped:
+        parser.error('--grouped can\'t be used with --format binary')
+
+    if args.watch and (args.rank or args.format == 'binary' or args.gzip or args.jobs > 1):
+        parser.error('--watch can\'t be used with --rank, --format binary, --gzip or --jobs')
+
+    if args.rank:
+        try:
+            score = parse_rank(args.rank)
+        except KeyError as e:
+            parser.error(f'unknown score "{e.args[0]}"')
+
+    config_file = args.config if args.config else CONFIG_FILENAME
+
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f'No config file found. Creating {CONFIG_FILENAME}')
+
+        with open(CONFIG_FILENAME, 'w') as c:
+            c.write(json.dumps(CONFIG_BODY, indent=4))
+
+        exit(1)
+
+    stats = Stats(args.profile) if args.stats or args.profile else None
+    if stats:
+        phase = stats.phase
+    else:
+        phase = lambda name, profile=False: contextlib.nullcontext()
+
+    with phase('parse_file'):
+        courses_by_nrc = parse_file(args.data, None if args.no_cache else CACHE_DIR)
+
+    if args.sections:
+        catalog = Catalog(courses_by_nrc)
+
+        try:
+            available = catalog.available(config[CONFIG_KEYS[ConfigKey.TIME_RESTRICTIONS]])
+            professor_blacklist = set(config[CONFIG_KEYS[ConfigKey.PROFESSOR_BLACKLIST]])
+            course_blacklist = set(config[CONFIG_KEYS[ConfigKey.COURSE_BLACKLIST]])
+        except KeyError as e:
+            print(
+                f'Key "{e.args[0]}" not found. Make sure to update `{config_file}`.',
+                file=sys.stderr
+            )
+            exit(1)
+
+        rows = [
+            [nrc, name, professor]
+            for nrc, name, professor, fits in zip(catalog.nrcs, catalog.names, catalog.professors, available)
+            if fits and professor not in professor_blacklist and nrc not in course_blacklist
+        ]
+        print(format_table(rows, ['NRC', 'Materia', 'Profesor']))
+        exit(0)
+
+    if CONFIG_KEYS[ConfigKey.OPTIONAL_NAMES] in config:
+        if (
+            args.count or args.grouped or args.rank or args.sample is not None
+            or args.watch or args.gzip or args.jobs > 1
+        ):
+            parser.error(
+                f'"{CONFIG_KEYS[ConfigKey.OPTIONAL_NAMES]}" can\'t be used with '
+                '--count, --grouped, --rank, --sample, --watch, --gzip or --jobs'
+            )
+
+        if args.format == 'binary':
+            parser.error(f'"{CONFIG_KEYS[ConfigKey.OPTIONAL_NAMES]}" can\'t be used with --format binary')
+
+        try:
+            with phase('collect_courses'):
+                search = optional_search(courses_by_nrc, config, SEARCH_ORDERS[args.order])
+        except KeyError as e:
+            print(
+                f'Key "{e.args[0]}" not found. Make sure to update `{config_file}`.',
+                file=sys.stderr
+            )
+            exit(1)
+        except ValueError as e:
+            print(f'{e}. Make sure to update `{config_file}`.', file=sys.stderr)
+            exit(1)
+
+        with phase('search', profile=True):
+            best = search.best(args.top)
+
+        with phase('render'):
+            writer = JsonLinesWriter() if args.format == 'jsonl' else ScheduleWriter(courses_by_nrc)
+            schedules = (tuple((nrc,) for nrc in nrcs) for _, nrcs in best)
+            write_schedules(writer, schedules, courses_by_nrc, limit=args.limit)
+
+        if stats:
+            stats.report()
+
+        exit(0)
+
+    if args.watch:
+        def show(schedules: list[tuple[tuple[str]]], search: IncrementalSearch):
+            if args.grouped:
+                count = len(schedules)
+            else:
+                count = sum(math.prod(map(len, schedule)) for schedule in schedules)
+
+            if args.count:
+                print(count)
+            else:
+                writer = JsonLinesWriter() if args.format == 'jsonl' else ScheduleWriter(courses_by_nrc)
+                write_schedules(writer, schedules, courses_by_nrc, args.grouped, args.limit)
+
+            print(f'{count} schedules ({search.mode}), watching `{config_file}`...', file=sys.stderr)
+
+        try:
+            watch(config_file, courses_by_nrc, show, SEARCH_ORDERS[args.order])
+        except KeyboardInterrupt:
+            pass
+
+        exit(0)
+
+    try:
+        with phase('collect_courses'):
+            c, professor_whitelist = config_courses(courses_by_nrc, config)
+    except KeyError as e:
+        print(
+            f'Key "{e.args[0]}" not found. Make sure to update `{config_file}`.',
+            file=sys.stderr
+        )
+        exit(1)
+
+    with phase('search', profile=True):
+        search = (InstrumentedSearch if stats else ScheduleSearch)(
+            c,
+            professor_whitelist=professor_whitelist,
+            order=SEARCH_ORDERS[args.order]
+        )
+
+    if args.count:
+        with phase('search', profile=True):
+            count = search.count(grouped=args.grouped)
+
+        print(count)
+    else:
+        output = sys.stdout.buffer
+        if args.gzip:
+            output = gzip.GzipFile(fileobj=output, mode='wb')
+
+        if args.format == 'binary':
+            writer = BinaryWriter([course.nrc for courses in c for course in courses], len(c), output)
+        else:
+            if args.gzip:
+                output = io.TextIOWrapper(output, encoding='utf-8')
+            else:
+                output = sys.stdout
+
+            if args.format == 'jsonl':
+                writer = JsonLinesWriter(output)
+            else:
+                writer = ScheduleWriter(courses_by_nrc, output)
+
+        if args.rank:
+            with phase('search', profile=True):
+                best = search.best(args.top, score)
+
+            if args.grouped:
+                schedules = [tuple((nrc,) for nrc in nrcs) for _, nrcs in best]
+            else:
+                schedules = [nrcs for _, nrcs in best]
+        elif args.sample is not None:
+            with phase('search', profile=True):
+                schedules = search.sample(args.sample, random.Random(args.seed), args.grouped)
+        else:
+            schedules = search.parallel(args.jobs) if args.jobs > 1 else iter(search)
+            if not args.grouped:
+                schedules = expand_groups(schedules)
+
+            if stats:
+                schedules = stats.timed(schedules, 'search', profile=True)
+
+        for schedule in itertools.islice(schedules, args.limit):
+            with phase('render'):
+                if args.grouped:
+                    prot = SchedulePrototype.from_nrcs([g[0] for g in schedule], courses_by_nrc)
+                    writer.write(prot, groups=schedule)
+                else:
+                    writer.write(SchedulePrototype.from_nrcs(schedule, courses_by_nrc))
+
+        with phase('render'):
+            writer.flush()
+            output.close()
+
+    if stats:
+        stats.report(search)